@@ -0,0 +1,52 @@
+"""
+Compare cache payload size and decode time of the stat encodings.
+
+Encodes the full course list of the synthetic data (one course per 1000
+enrollments, at least 10):
+
+* the previous path: pickled ``CourseOverview`` instances with an
+  ``enrollment_count`` annotation;
+* pickled compact ``(course_id, display_name, enrollment_count)`` rows,
+  as cached by ``course_stats_all``;
+* ``edx_stats.serialization``, decoding the whole list and decoding only
+  the first page of rows.
+
+Each benchmark times one decode and records the payload size in its
+``extra_info``. Run it like ``bench_stats.py``::
+
+    pytest --ds=lms.envs.test /path/to/edx-stats/benchmarks/bench_cache_payloads.py \\
+        --stats-enrollments 1000000 --benchmark-autosave
+"""
+import pickle
+
+import pytest
+from django.db.models import Count
+from openedx.core.djangoapps.content.course_overviews.models import CourseOverview
+
+from edx_stats import app_settings, serialization, sites, views
+
+PAYLOADS = ['pickle-instances', 'pickle-rows', 'serialization-full', 'serialization-first-page']
+
+
+@pytest.fixture(scope='module')
+def course_payloads(stats_db):  # pylint: disable=unused-argument
+    """Each encoding of the course list, with the function decoding it, by name."""
+    courses = list(CourseOverview.objects.using(app_settings.STATS_DATABASE).annotate(
+        enrollment_count=Count('courseenrollment')
+    ))
+    rows = views.get_course_rows(sites.PLATFORM)
+    encoded = serialization.encode(rows)
+    page_size = app_settings.STATS_COURSE_LIST_PAGE_SIZE
+    return {
+        'pickle-instances': (pickle.dumps(courses), pickle.loads),
+        'pickle-rows': (pickle.dumps(rows), pickle.loads),
+        'serialization-full': (encoded, lambda data: list(serialization.decode(data))),
+        'serialization-first-page': (encoded, lambda data: serialization.decode(data)[:page_size]),
+    }
+
+
+@pytest.mark.parametrize('payload', PAYLOADS)
+def test_decode(benchmark, course_payloads, payload):  # pylint: disable=redefined-outer-name
+    encoded, decode = course_payloads[payload]
+    benchmark.extra_info['payload_bytes'] = len(encoded)
+    benchmark(decode, encoded)
@@ -0,0 +1,116 @@
+"""
+Benchmark every stat function and HTMX view on synthetic data.
+
+Times each stat computed straight from the database, each stat read through
+the cache when it is cold and when it is warm, the course list page, the
+exports, the course and country pages with their lists rendered or read
+from the fragment cache, and every HTMX partial of the ``core`` dashboard. Each benchmark
+records the queries of one call in its ``extra_info``; save them with
+``--benchmark-json`` or ``--benchmark-autosave`` and compare two runs with
+``pytest-benchmark compare``.
+
+Run from an Open edX checkout with this package, pytest-django and
+pytest-benchmark installed::
+
+    pytest --ds=lms.envs.test /path/to/edx-stats/benchmarks/bench_stats.py \\
+        --stats-enrollments 1000000 --benchmark-autosave
+
+The summary tables are seeded when ``edx_stats.core`` is installed, so
+their read path is the one measured.
+"""
+import pytest
+from django.apps import apps
+from django.contrib.auth import get_user_model
+from django.test import Client
+from django.urls import NoReverseMatch, reverse
+
+from edx_stats import app_settings, sites, views
+
+STAT_KEYS = sorted(views.STATS_FUNCTIONS)
+
+# URL names of the list pages, with their query string
+LIST_VIEWS = [
+    ('course_list', ''),
+    ('course_list', '?sort=name'),
+    ('country_list', ''),
+]
+
+# URL names of the core HTMX partials, with their query string
+HTMX_VIEWS = [
+    ('htmx_courses', ''),
+    ('htmx_countries', ''),
+    ('htmx_yearly_stats', ''),
+    ('htmx_dashboard', ''),
+    ('htmx_dashboard_stats', ''),
+    ('htmx_series', '?interval=week&days=90'),
+]
+
+
+@pytest.mark.parametrize('key_suffix', STAT_KEYS)
+def test_compute_stat(measure, key_suffix):
+    measure(lambda: views.STATS_FUNCTIONS[key_suffix](sites.PLATFORM))
+
+
+@pytest.mark.parametrize('cache', ['cold', 'warm'])
+@pytest.mark.parametrize('key_suffix', STAT_KEYS)
+def test_get_stats(measure, key_suffix, cache):
+    measure(lambda: views.get_stats(key_suffix, sites.PLATFORM), cache)
+
+
+@pytest.mark.parametrize('cache', ['cold', 'warm'])
+def test_get_stats_many(measure, cache):
+    measure(lambda: views.get_stats_many(STAT_KEYS, sites.PLATFORM), cache)
+
+
+@pytest.mark.parametrize('cache', ['cold', 'warm'])
+@pytest.mark.parametrize('sort', sorted(views.COURSE_SORTS))
+def test_course_page(measure, sort, cache):
+    measure(lambda: views.get_course_page(sort), cache)
+
+
+@pytest.mark.parametrize('name', sorted(views.EXPORTS))
+def test_export(measure, name):
+    _, rows = views.EXPORTS[name]
+    measure(lambda: sum(1 for _ in rows(sites.PLATFORM)))
+
+
+@pytest.fixture
+def staff_client(stats_db):  # pylint: disable=unused-argument
+    user, _ = get_user_model().objects.get_or_create(
+        username='stats-benchmark-staff', defaults={'is_staff': True}
+    )
+    client = Client()
+    client.force_login(user)
+    return client
+
+
+@pytest.mark.parametrize('fragments', ['rendered', 'cached'])
+@pytest.mark.parametrize('url_name,query', LIST_VIEWS)
+def test_list_view(measure, staff_client, monkeypatch, url_name, query, fragments):  # pylint: disable=redefined-outer-name
+    monkeypatch.setattr(app_settings, 'STATS_FRAGMENT_CACHE', fragments == 'cached')
+    url = reverse(f'edx_stats:{url_name}') + query
+
+    def get():
+        response = staff_client.get(url)
+        assert response.status_code == 200
+        return response
+
+    measure(get, 'warm')
+
+
+@pytest.mark.parametrize('cache', ['cold', 'warm'])
+@pytest.mark.parametrize('url_name,query', HTMX_VIEWS)
+def test_htmx_view(measure, staff_client, url_name, query, cache):  # pylint: disable=redefined-outer-name
+    if not apps.is_installed('edx_stats.core'):
+        pytest.skip("edx_stats.core is not installed")
+    try:
+        url = reverse(f'core:{url_name}') + query
+    except NoReverseMatch:
+        pytest.skip("The core URLs are not included under the 'core' namespace")
+
+    def get():
+        response = staff_client.get(url, HTTP_HX_REQUEST='true')
+        assert response.status_code == 200
+        return response
+
+    measure(get, cache)
@@ -0,0 +1,145 @@
+"""
+Fixtures for the stats benchmarks.
+
+They run with pytest-django and pytest-benchmark inside an Open edX
+environment, against a test database filled once per session by the
+``generate_stats_data`` command.
+"""
+from concurrent.futures import Future
+from contextlib import ExitStack
+
+import pytest
+from django.apps import apps
+from django.core.cache import cache as django_cache
+from django.core.management import call_command
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test.utils import CaptureQueriesContext, setup_databases, teardown_databases
+
+from edx_stats import app_settings, cache, compute
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup('edx_stats')
+    group.addoption(
+        '--stats-enrollments',
+        type=int,
+        default=10000,
+        help="Synthetic enrollments to generate (default: 10000); 0 to use the data already in "
+             "the database, e.g. with --reuse-db.",
+    )
+    group.addoption(
+        '--stats-seed',
+        type=int,
+        default=0,
+        help="Random seed of the synthetic data (default: 0).",
+    )
+    group.addoption(
+        '--stats-cold-rounds',
+        type=int,
+        default=5,
+        help="Rounds of each cold cache benchmark (default: 5).",
+    )
+
+
+@pytest.fixture(scope='session')
+def django_db_setup(request, django_test_environment, django_db_blocker):  # pylint: disable=unused-argument
+    """
+    Create the test databases, fill them with synthetic data, and seed the
+    summary tables.
+
+    The benchmarks carry no ``django_db`` marks, so the databases are set up
+    here rather than by pytest-django.
+    """
+    keepdb = request.config.getoption('reuse_db')
+    enrollments = request.config.getoption('--stats-enrollments')
+    with django_db_blocker.unblock():
+        db_config = setup_databases(
+            verbosity=request.config.option.verbose,
+            interactive=False,
+            aliases={DEFAULT_DB_ALIAS, app_settings.STATS_DATABASE},
+            keepdb=keepdb,
+        )
+        if enrollments:
+            call_command(
+                'generate_stats_data',
+                enrollments=enrollments,
+                seed=request.config.getoption('--stats-seed'),
+                clear=True,
+                skip_rebuild=True,
+                force=True,
+            )
+        if apps.is_installed('edx_stats.core'):
+            from edx_stats.core import backfill, timeseries  # pylint: disable=import-outside-toplevel
+            backfill.backfill(sleep=0, restart=True)
+            timeseries.rebuild()
+    yield
+    if not keepdb:
+        with django_db_blocker.unblock():
+            teardown_databases(db_config, verbosity=request.config.option.verbose)
+
+
+@pytest.fixture(scope='session')
+def stats_db(django_db_setup, django_db_blocker):  # pylint: disable=redefined-outer-name
+    """
+    Database access without the usual per-test transaction, which the
+    compute threads, on their own connections, could not see into.
+    """
+    with django_db_blocker.unblock():
+        yield
+
+
+def clear_stats_cache():
+    """Empty the shared cache (local memory in test settings) and this process's cache."""
+    django_cache.clear()
+    cache.local_cache.clear()
+    cache.local_fragments.clear()
+
+
+class InlineExecutor:
+    """Runs each submitted call right away on the calling thread."""
+
+    def submit(self, function, *args):
+        future = Future()
+        try:
+            future.set_result(function(*args))
+        except Exception as error:  # pylint: disable=broad-except
+            future.set_exception(error)
+        return future
+
+
+def count_queries(function):
+    """Call ``function`` and return the number of queries it ran on the stats databases."""
+    with ExitStack() as stack:
+        contexts = [
+            stack.enter_context(CaptureQueriesContext(connections[alias]))
+            for alias in {DEFAULT_DB_ALIAS, app_settings.STATS_DATABASE}
+        ]
+        function()
+    return sum(len(context) for context in contexts)
+
+
+@pytest.fixture
+def measure(benchmark, stats_db, monkeypatch, request):  # pylint: disable=redefined-outer-name,unused-argument
+    """
+    Benchmark a function with the cache in a given state, and record the
+    number of queries of one call in the benchmark's ``extra_info``.
+
+    ``cache`` is 'cold' (cleared before each round), 'warm' (filled by a
+    first call), or None for functions that do not read the cache.
+    """
+    cold_rounds = request.config.getoption('--stats-cold-rounds')
+
+    def measure(function, cache=None):  # pylint: disable=redefined-outer-name
+        benchmark.extra_info['cache'] = cache
+        with monkeypatch.context() as patch:
+            # Count the queries of the compute threads too
+            patch.setattr(compute, '_executor', InlineExecutor())
+            clear_stats_cache()
+            if cache == 'warm':
+                function()
+            benchmark.extra_info['queries'] = count_queries(function)
+        if cache == 'cold':
+            return benchmark.pedantic(function, setup=clear_stats_cache, rounds=cold_rounds)
+        return benchmark(function)
+
+    return measure
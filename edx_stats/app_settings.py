@@ -9,5 +9,63 @@ STATS_REFRESH_INTERVAL = getattr(settings, 'STATS_REFRESH_INTERVAL', 3600)
 # Number of top items to show in dashboard
 STATS_DASHBOARD_TOP_ITEMS = getattr(settings, 'STATS_DASHBOARD_TOP_ITEMS', 10)
 
+# Number of courses per page of the course list
+STATS_COURSE_LIST_PAGE_SIZE = getattr(settings, 'STATS_COURSE_LIST_PAGE_SIZE', 50)
+
+# Cache the rendered HTML of the course and country lists, keyed by the version of the data they show
+STATS_FRAGMENT_CACHE = getattr(settings, 'STATS_FRAGMENT_CACHE', True)
+
+# Rows fetched from the database at a time by the streaming exports
+STATS_EXPORT_CHUNK_SIZE = getattr(settings, 'STATS_EXPORT_CHUNK_SIZE', 2000)
+
+# Read total courses, enrollments and users from table statistics instead of exact counts
+STATS_APPROXIMATE_TOTALS = getattr(settings, 'STATS_APPROXIMATE_TOTALS', False)
+
+# Serve the uncached diagnostic comparison of user counts outside of DEBUG
+STATS_DIAGNOSTICS_ENABLED = getattr(settings, 'STATS_DIAGNOSTICS_ENABLED', False)
+
+# Database alias every statistic query reads from, e.g. a read replica
+STATS_DATABASE = getattr(settings, 'STATS_DATABASE', 'default')
+
+# Replica lag (in seconds) above which the dashboards warn that statistics may be out of date
+STATS_REPLICA_LAG_WARNING = getattr(settings, 'STATS_REPLICA_LAG_WARNING', 300)
+
+# Seconds the measured replica lag is cached for
+STATS_REPLICA_LAG_CACHE_TIMEOUT = getattr(settings, 'STATS_REPLICA_LAG_CACHE_TIMEOUT', 5)
+
+# Route the HTMX endpoints to the async views in core.async_views, for ASGI deployments
+STATS_ASYNC_VIEWS = getattr(settings, 'STATS_ASYNC_VIEWS', False)
+
+# Statistics computed at once by the async views, per worker process
+STATS_ASYNC_CONCURRENCY = getattr(settings, 'STATS_ASYNC_CONCURRENCY', 4)
+
+# Record per-stat cache hits, compute times, query counts and payload sizes
+STATS_METRICS_ENABLED = getattr(settings, 'STATS_METRICS_ENABLED', False)
+
+# Seconds between flushes of each worker's metrics to the shared cache
+STATS_METRICS_FLUSH_INTERVAL = getattr(settings, 'STATS_METRICS_FLUSH_INTERVAL', 10)
+
+# Bearer token letting a Prometheus scraper read the metrics without a staff login
+STATS_METRICS_TOKEN = getattr(settings, 'STATS_METRICS_TOKEN', None)
+
+# Keep top-N course and country counters in Redis sorted sets when the default cache is django-redis
+STATS_TOPN_COUNTERS = getattr(settings, 'STATS_TOPN_COUNTERS', True)
+
+# Primary keys of a source table counted per query by rebuild_stats
+STATS_REBUILD_CHUNK_SIZE = getattr(settings, 'STATS_REBUILD_CHUNK_SIZE', 10000)
+
+# Summary table rows written per transaction by rebuild_stats
+STATS_REBUILD_BATCH_SIZE = getattr(settings, 'STATS_REBUILD_BATCH_SIZE', 500)
+
+# Seconds rebuild_stats sleeps after each chunk and batch, to throttle its load on the primary
+STATS_REBUILD_SLEEP = getattr(settings, 'STATS_REBUILD_SLEEP', 0.1)
+
+# Seconds after which rebuild_stats starts over instead of resuming an interrupted run
+STATS_REBUILD_CHECKPOINT_MAX_AGE = getattr(settings, 'STATS_REBUILD_CHECKPOINT_MAX_AGE', 86400)
+
+# Seconds over which registrations and enrollments are added up before they are written to the
+# user and yearly totals, instead of updating those rows once each
+STATS_SUMMARY_FLUSH_INTERVAL = getattr(settings, 'STATS_SUMMARY_FLUSH_INTERVAL', 10)
+
 # Login URL (use Open edX's login URL)
 LOGIN_URL = getattr(settings, 'LOGIN_URL', '/login')
\ No newline at end of file
@@ -1,9 +1,26 @@
 """
 Cache utilities for edx_stats using Open edX's Redis setup.
 """
+import hashlib
+import logging
+import struct
+import threading
+import time
+import uuid
+import zlib
+from collections import OrderedDict, namedtuple
+from functools import partial
+
+from crum import get_current_request
 from django.core.cache import cache
 from django.conf import settings
-from openedx.core.djangoapps.site_configuration import helpers as configuration_helpers
+from django.db import OperationalError
+from django.utils.translation import get_language
+
+from . import compute, metrics, serialization, sites
+from .compute import StatsUnavailable
+
+logger = logging.getLogger(__name__)
 
 # Cache keys
 STATS_CACHE_KEY_PREFIX = 'edx_stats:'
@@ -12,35 +29,505 @@ COUNTRY_STATS_CACHE_KEY = f'{STATS_CACHE_KEY_PREFIX}country_stats'
 YEARLY_STATS_CACHE_KEY = f'{STATS_CACHE_KEY_PREFIX}yearly_stats'
 TOTAL_STATS_CACHE_KEY = f'{STATS_CACHE_KEY_PREFIX}total_stats'
 
+SITES_CACHE_KEY = f'{STATS_CACHE_KEY_PREFIX}site_prefixes'
+VERSION_CACHE_KEY = f'{STATS_CACHE_KEY_PREFIX}version'
+PENDING_CACHE_KEY_PREFIX = f'{STATS_CACHE_KEY_PREFIX}pending:'
+FRAGMENT_KEY_SUFFIX_PREFIX = 'fragment:'
+LOCK_CACHE_KEY_SUFFIX = ':lock'
+
 # Cache timeout (in seconds)
 STATS_CACHE_TIMEOUT = getattr(settings, 'STATS_CACHE_TIMEOUT', 3600)  # 1 hour default
 
-def get_cache_key(key_suffix):
+# How long (in seconds) an expired value may still be served while it is recomputed
+STATS_CACHE_STALE_TIMEOUT = getattr(settings, 'STATS_CACHE_STALE_TIMEOUT', STATS_CACHE_TIMEOUT)
+
+# Upper bound (in seconds) on a recompute holding the per-key lock
+STATS_CACHE_LOCK_TIMEOUT = getattr(settings, 'STATS_CACHE_LOCK_TIMEOUT', 300)
+
+# How long (in seconds) a worker serves a stat from its own memory before re-reading the cache
+STATS_LOCAL_CACHE_TIMEOUT = getattr(settings, 'STATS_LOCAL_CACHE_TIMEOUT', 30)
+
+# Number of stats each worker keeps in memory (0 disables the in-memory cache)
+STATS_LOCAL_CACHE_SIZE = getattr(settings, 'STATS_LOCAL_CACHE_SIZE', 256)
+
+# Number of rendered list fragments each worker keeps in memory, apart from the stats
+STATS_LOCAL_FRAGMENT_CACHE_SIZE = getattr(settings, 'STATS_LOCAL_FRAGMENT_CACHE_SIZE', 64)
+
+# Window (in seconds) in which invalidations are coalesced into one flush
+STATS_INVALIDATION_WINDOW = getattr(settings, 'STATS_INVALIDATION_WINDOW', 60)
+
+# Stat key suffixes affected by a change to each source model
+STATS_DEPENDENCIES = {
+    'CourseOverview': ('course_stats_top', 'course_stats_all', 'total_stats'),
+    'CourseEnrollment': ('course_stats_top', 'course_stats_all', 'yearly_stats', 'total_stats'),
+    'User': ('yearly_stats', 'total_stats'),
+    'UserProfile': ('country_stats_top', 'country_stats_all'),
+}
+
+# Cached value with the time after which it should be recomputed, the time
+# it was computed, and a digest of its encoded data
+CachedStats = namedtuple('CachedStats', ['data', 'expires', 'computed', 'etag'])
+
+# Content version of the stats served to a request: a digest of their
+# digests, and the time the newest one was computed
+ContentVersion = namedtuple('ContentVersion', ['etag', 'computed'])
+
+# Cached values are stored as this header (a format marker, the expiry time
+# and the compute time) followed by the ``serialization``-encoded data, so
+# the times can be read or reset without decoding the data
+ENTRY_HEADER = struct.Struct('!cdd')
+
+# Marks the current header; values written with the previous, expiry-only
+# header start with the first byte of a timestamp instead
+ENTRY_FORMAT = b'\x01'
+
+# Serializes this process's registrations when the cache is not Redis
+_sites_lock = threading.Lock()
+
+
+class LocalCache:
+    """
+    Bounded, thread-safe LRU of decoded stats in front of the shared cache.
+
+    Each entry is tagged with the stats version (VERSION_CACHE_KEY) it was
+    read under, and is only served while that is still the current version
+    and for at most STATS_LOCAL_CACHE_TIMEOUT seconds.
     """
-    Get a cache key with the site-specific prefix.
+
+    def __init__(self, max_entries, timeout):
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, version):
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            item_version, stored, entry = item
+            if item_version != version or time.monotonic() - stored > self.timeout:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, version, entry):
+        if not self.max_entries:
+            return
+        with self._lock:
+            self._entries[key] = (version, time.monotonic(), entry)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+local_cache = LocalCache(STATS_LOCAL_CACHE_SIZE, STATS_LOCAL_CACHE_TIMEOUT)
+
+# Rendered fragments, kept apart so paging through a list cannot evict the stats
+local_fragments = LocalCache(STATS_LOCAL_FRAGMENT_CACHE_SIZE, STATS_LOCAL_CACHE_TIMEOUT)
+
+def _request_memo():
+    """
+    Get a dict that lives as long as the current request, or a throwaway one
+    outside of a request.
+    """
+    request = get_current_request()
+    if request is None:
+        return {}
+    if not hasattr(request, '_edx_stats_memo'):
+        request._edx_stats_memo = {}
+    return request._edx_stats_memo
+
+def get_stats_version():
     """
-    site_prefix = configuration_helpers.get_value('SITE_NAME', 'default')
+    Get the current stats version, read from the shared cache at most once
+    per request.
+    """
+    memo = _request_memo()
+    if 'version' not in memo:
+        memo['version'] = cache.get(VERSION_CACHE_KEY, 0)
+    return memo['version']
+
+def bump_stats_version():
+    """
+    Move to a new stats version, so that every worker drops the stats it
+    holds in memory.
+    """
+    try:
+        cache.incr(VERSION_CACHE_KEY)
+    except ValueError:
+        if not cache.add(VERSION_CACHE_KEY, 1, None):
+            cache.incr(VERSION_CACHE_KEY)
+    _request_memo().pop('version', None)
+
+def get_redis():
+    """
+    Get the Redis client of the default cache, or None when it is not
+    django-redis.
+    """
+    try:
+        from django_redis import get_redis_connection  # pylint: disable=import-outside-toplevel
+        return get_redis_connection('default')
+    except (ImportError, NotImplementedError):
+        return None
+
+def _register_site(cache_key):
+    """
+    Record the site prefix of a stat being written, so invalidation can
+    reach its keys without a SCAN.
+
+    Every write registers it again, so the registry is rebuilt by the next
+    writes after it is deleted, by ``invalidate_stats_cache`` in any process
+    or an eviction. On Redis, the registry is a set added to with ``SADD``,
+    so concurrent registrations never drop each other.
+    """
+    site_prefix = cache_key[len(STATS_CACHE_KEY_PREFIX):].split(':', 1)[0]
+    client = get_redis()
+    if client is not None:
+        client.sadd(cache.make_key(SITES_CACHE_KEY), site_prefix)
+        return
+    with _sites_lock:
+        site_prefixes = cache.get(SITES_CACHE_KEY) or set()
+        if site_prefix not in site_prefixes:
+            cache.set(SITES_CACHE_KEY, site_prefixes | {site_prefix}, None)
+
+def get_cache_key(key_suffix, scope=None):
+    """
+    Get a cache key with the prefix of a ``sites.Scope``.
+
+    Sites with the same orgs share a scope, and so share their cached stats.
+    ``scope`` defaults to the current request's site's, and must be given
+    when there is no request, e.g. in the background precompute.
+    """
+    if scope is not None:
+        site_prefix = sites.scope_key(scope)
+    else:
+        memo = _request_memo()
+        if 'site' not in memo:
+            memo['site'] = sites.scope_key(sites.get_current_scope())
+        site_prefix = memo['site']
     return f'{STATS_CACHE_KEY_PREFIX}{site_prefix}:{key_suffix}'
 
+def get_known_sites():
+    """
+    Get the prefixes of every site whose stats have been cached.
+    """
+    client = get_redis()
+    if client is not None:
+        return {site_prefix.decode() for site_prefix in client.smembers(cache.make_key(SITES_CACHE_KEY))}
+    return cache.get(SITES_CACHE_KEY) or set()
+
+def _read(entry):
+    """
+    Decode a cached value, returning None when it is missing, was written
+    in another format or is corrupt.
+    """
+    if not isinstance(entry, bytes) or len(entry) <= ENTRY_HEADER.size or entry[:1] != ENTRY_FORMAT:
+        return None
+    payload = entry[ENTRY_HEADER.size:]
+    try:
+        data = serialization.decode(payload)
+    except (ValueError, TypeError, KeyError, AttributeError, zlib.error):
+        return None
+    _, expires, computed = ENTRY_HEADER.unpack_from(entry)
+    return CachedStats(data, expires, computed, hashlib.md5(payload).hexdigest()[:16])
+
+def _serve(cache_key, entry):
+    """
+    Record the content version of ``entry`` as served to the current request
+    under ``cache_key``, and return its data.
+    """
+    _request_memo().setdefault('served', {})[cache_key] = (entry.etag, entry.computed)
+    return entry.data
+
+def get_content_version(cache_keys):
+    """
+    Get the content version of the stats served to the current request
+    under ``cache_keys``.
+
+    Returns:
+        ContentVersion: Its ``etag`` changes whenever the data of one of the
+            stats does, or None when one of them has not been served
+    """
+    served = _request_memo().get('served', {})
+    if not all(cache_key in served for cache_key in cache_keys):
+        return None
+    versions = [served[cache_key] for cache_key in cache_keys]
+    return ContentVersion(
+        hashlib.md5(','.join(etag for etag, _ in versions).encode()).hexdigest()[:16],
+        max(computed for _, computed in versions),
+    )
+
+def set_cached_stats(cache_key, data, timeout=None):
+    """
+    Cache ``data`` fresh for ``timeout`` (default STATS_CACHE_TIMEOUT) seconds
+    and servable as stale for STATS_CACHE_STALE_TIMEOUT after that.
+
+    The stats version is left alone, so the workers holding the previous
+    value in memory keep it for up to STATS_LOCAL_CACHE_TIMEOUT instead of
+    all dropping every stat they hold; only invalidations move it.
+
+    Returns:
+        CachedStats: The cached value
+    """
+    timeout = timeout or STATS_CACHE_TIMEOUT
+    payload = serialization.encode(data)
+    now = time.time()
+    cache.set(cache_key, ENTRY_HEADER.pack(ENTRY_FORMAT, now + timeout, now) + payload, timeout + STATS_CACHE_STALE_TIMEOUT)
+    _register_site(cache_key)
+    metrics.increment(metrics.stat_name(cache_key), writes=1, payload_bytes=len(payload))
+    return CachedStats(data, now + timeout, now, hashlib.md5(payload).hexdigest()[:16])
+
+def _compute(cache_key, data_function):
+    """
+    Compute and cache the data, with every query bounded by STATS_QUERY_TIMEOUT.
+
+    Returns:
+        CachedStats: The cached value
+    """
+    with compute.statement_timeout():
+        data = data_function()
+    return set_cached_stats(cache_key, data)
+
+def _compute_locked(cache_key, data_function, lock_key, token):
+    """
+    Compute and cache the data while holding the lock, then release it.
+    """
+    try:
+        return _compute(cache_key, data_function)
+    finally:
+        if cache.get(lock_key) == token:
+            cache.delete(lock_key)
+
 def get_cached_stats(cache_key, data_function):
     """
     Get stats from cache or compute them if not cached.
 
+    Fresh values are first looked up in this worker's ``local_cache``, which
+    costs one read of the stats version per request.
+
+    Only one worker recomputes a key at a time. It holds a lock taken with
+    ``cache.add`` (``SET NX`` on Redis, and equally atomic on the local memory
+    backend), while every other request keeps serving the expired value, or,
+    when there is none yet, waits for the recompute for as long as the lock
+    is held, up to STATS_CACHE_LOCK_TIMEOUT. Only the lock holder computes:
+    a waiter whose holder gave up takes the lock over.
+
+    A recompute that times out or loses its database connection serves the
+    expired value when there is one.
+
     Args:
         cache_key (str): The cache key to use
         data_function (callable): Function to call to compute the data if not cached
 
     Returns:
         The cached or computed data
+
+    Raises:
+        StatsUnavailable: If the recompute failed with nothing to serve instead
     """
-    data = cache.get(cache_key)
-    if data is None:
-        data = data_function()
-        cache.set(cache_key, data, STATS_CACHE_TIMEOUT)
-    return data
+    # Read the version first, so a value written meanwhile is never kept
+    # in memory under the newer version
+    version = get_stats_version()
+    entry = local_cache.get(cache_key, version)
+    if entry is not None and entry.expires > time.time():
+        metrics.increment(metrics.stat_name(cache_key), hits=1)
+        return _serve(cache_key, entry)
+
+    entry = _read(cache.get(cache_key))
+    if entry is not None and entry.expires > time.time():
+        local_cache.set(cache_key, version, entry)
+        metrics.increment(metrics.stat_name(cache_key), hits=1)
+        return _serve(cache_key, entry)
+
+    return _serve(cache_key, _refresh(cache_key, data_function, entry))
+
+def _refresh(cache_key, data_function, entry):
+    """
+    Recompute a missing or expired value under the per-key lock, or serve
+    the expired ``entry`` (or wait for it) while another worker does.
+
+    Returns:
+        CachedStats: The value to serve
+    """
+    lock_key = f'{cache_key}{LOCK_CACHE_KEY_SUFFIX}'
+    token = uuid.uuid4().hex
+    stat = metrics.stat_name(cache_key)
+    try:
+        if cache.add(lock_key, token, STATS_CACHE_LOCK_TIMEOUT):
+            metrics.increment(stat, misses=1)
+            return _compute_locked(cache_key, data_function, lock_key, token)
+
+        if entry is not None:
+            metrics.increment(stat, stale=1)
+            return entry
+
+        metrics.increment(stat, misses=1)
+        deadline = time.monotonic() + STATS_CACHE_LOCK_TIMEOUT
+        while time.monotonic() < deadline:
+            time.sleep(0.1)
+            entry = _read(cache.get(cache_key))
+            if entry is not None:
+                return entry
+            # The holder released the lock without caching a value
+            if cache.add(lock_key, token, STATS_CACHE_LOCK_TIMEOUT):
+                return _compute_locked(cache_key, data_function, lock_key, token)
+        metrics.increment(stat, unavailable=1)
+        raise StatsUnavailable(cache_key)
+    except OperationalError as e:
+        logger.warning(f"Could not compute {cache_key}: {str(e)}")
+        if entry is None:
+            metrics.increment(stat, unavailable=1)
+            raise StatsUnavailable(cache_key) from e
+        return entry
+
+def get_cached_stats_many(data_functions):
+    """
+    Get several stats at once, like :func:`get_cached_stats`.
+
+    Every value not in this worker's memory is fetched with a single
+    ``get_many``, and the missing or expired ones are recomputed
+    concurrently, each under its own lock. Stats that could not be computed
+    and have no expired value to serve are left out of the result.
+
+    Args:
+        data_functions (dict): Function computing each stat, by cache key
+
+    Returns:
+        dict: The cached or computed data, by cache key
+    """
+    version = get_stats_version()
+    now = time.time()
+    results = {}
+    for cache_key in data_functions:
+        entry = local_cache.get(cache_key, version)
+        if entry is not None and entry.expires > now:
+            metrics.increment(metrics.stat_name(cache_key), hits=1)
+            results[cache_key] = _serve(cache_key, entry)
+
+    expired = {}
+    fetched = cache.get_many([key for key in data_functions if key not in results])
+    for cache_key in data_functions:
+        if cache_key in results:
+            continue
+        entry = _read(fetched.get(cache_key))
+        if entry is not None and entry.expires > now:
+            local_cache.set(cache_key, version, entry)
+            metrics.increment(metrics.stat_name(cache_key), hits=1)
+            results[cache_key] = _serve(cache_key, entry)
+        else:
+            expired[cache_key] = entry
+
+    if expired:
+        # Served from this thread, since the request is only current on it
+        results.update({
+            cache_key: _serve(cache_key, entry)
+            for cache_key, entry in compute.run_concurrently({
+                cache_key: partial(_refresh, cache_key, data_functions[cache_key], entry)
+                for cache_key, entry in expired.items()
+            }).items()
+        })
+    return results
+
+def get_cached_fragment(name, content_version, params, render_function):
+    """
+    Get rendered HTML from the cache, rendering and caching it when missing.
+
+    The key holds the current site, ``content_version``, ``params`` and the
+    language, so a new version of the data a fragment shows moves it to a
+    new key, and the old one expires unread. Fragments are stored under the
+    site's prefix, so ``invalidate_stats_cache`` drops them with the stats,
+    and kept in this worker's ``local_fragments``.
+
+    Args:
+        name (str): The fragment, e.g. its template name
+        content_version: The version of the data it shows
+        params (tuple): The other values it depends on, e.g. its page
+        render_function (callable): Function rendering the HTML if not cached
+
+    Returns:
+        str: The HTML
+    """
+    digest = hashlib.md5(repr((content_version, params, get_language())).encode()).hexdigest()[:16]
+    cache_key = get_cache_key(f'{FRAGMENT_KEY_SUFFIX_PREFIX}{name}:{digest}')
+    version = get_stats_version()
+    html = local_fragments.get(cache_key, version)
+    if html is not None:
+        return html
+    html = cache.get(cache_key)
+    if html is None:
+        html = render_function()
+        cache.set(cache_key, html, STATS_CACHE_TIMEOUT)
+    local_fragments.set(cache_key, version, html)
+    return html
 
 def invalidate_stats_cache():
     """
     Invalidate all stats cache.
     """
-    cache.delete_pattern(f'{STATS_CACHE_KEY_PREFIX}*')
\ No newline at end of file
+    cache.delete_pattern(f'{STATS_CACHE_KEY_PREFIX}*')
+    local_cache.clear()
+    local_fragments.clear()
+    bump_stats_version()
+
+def invalidate_stats(key_suffixes):
+    """
+    Mark the given stat keys as expired for every known site.
+
+    The values are kept for STATS_CACHE_STALE_TIMEOUT, so readers keep being
+    served while a single worker recomputes each key.
+    """
+    entries = cache.get_many([
+        f'{STATS_CACHE_KEY_PREFIX}{site_prefix}:{suffix}'
+        for site_prefix in get_known_sites()
+        for suffix in key_suffixes
+    ])
+    cache.set_many({
+        key: ENTRY_HEADER.pack(ENTRY_FORMAT, 0, ENTRY_HEADER.unpack_from(entry)[2]) + entry[ENTRY_HEADER.size:]
+        for key, entry in entries.items()
+        if isinstance(entry, bytes) and len(entry) > ENTRY_HEADER.size and entry[:1] == ENTRY_FORMAT
+    }, STATS_CACHE_STALE_TIMEOUT)
+    bump_stats_version()
+
+def flush_pending(key_suffixes):
+    """
+    Release the pending markers, then invalidate the coalesced keys.
+
+    Markers go first so that a change landing during the flush schedules a
+    new one instead of being lost.
+    """
+    cache.delete_many([f'{PENDING_CACHE_KEY_PREFIX}{suffix}' for suffix in key_suffixes])
+    invalidate_stats(key_suffixes)
+
+def schedule_invalidation(model_name):
+    """
+    Invalidate the stats depending on ``model_name`` at the end of the current
+    coalescing window.
+
+    The first change to a stat in a window claims its pending marker and
+    schedules the flush, as the ``edx_stats.flush_invalidations`` Celery
+    task with a countdown of the window, so it survives this process
+    exiting; every later change in the same window, from any process, is
+    already covered by it. When the task cannot be queued, the flush runs
+    right away.
+    """
+    key_suffixes = [
+        suffix for suffix in STATS_DEPENDENCIES[model_name]
+        if cache.add(f'{PENDING_CACHE_KEY_PREFIX}{suffix}', True, STATS_INVALIDATION_WINDOW * 2 or None)
+    ]
+    if not key_suffixes:
+        return
+    if not STATS_INVALIDATION_WINDOW:
+        flush_pending(key_suffixes)
+        return
+    try:
+        from .tasks import flush_invalidations  # pylint: disable=import-outside-toplevel
+        flush_invalidations.apply_async(args=(key_suffixes,), countdown=STATS_INVALIDATION_WINDOW)
+    except Exception:  # pylint: disable=broad-except
+        logger.warning("Could not queue the invalidation of %s; flushing it now", key_suffixes, exc_info=True)
+        flush_pending(key_suffixes)
@@ -0,0 +1,146 @@
+"""
+Concurrent computation of independent stats.
+
+Each stat runs on its own thread of a shared pool, and therefore on its own
+database connection, so a page missing several stats waits for the slowest
+aggregate instead of their sum. Queries run during a request are bounded by
+STATS_QUERY_TIMEOUT, so one slow aggregate cannot hold the page.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
+
+from django.conf import settings
+from django.db import connections, transaction
+
+from . import app_settings
+
+# Number of stats computed at the same time by each worker process
+STATS_COMPUTE_WORKERS = getattr(settings, 'STATS_COMPUTE_WORKERS', 4)
+
+# Longest (in seconds) a single stat query may run during a request; 0 for no limit
+STATS_QUERY_TIMEOUT = getattr(settings, 'STATS_QUERY_TIMEOUT', 30)
+
+# SQLite virtual machine instructions between two checks of the deadline
+SQLITE_PROGRESS_STEPS = 10000
+
+_executor = ThreadPoolExecutor(max_workers=STATS_COMPUTE_WORKERS, thread_name_prefix='edx-stats-compute')
+
+# Marks the pool's threads while they run a stat
+_pool_thread = threading.local()
+
+
+class StatsUnavailable(Exception):
+    """A stat could not be computed and has no cached value to fall back to."""
+
+
+@contextmanager
+def statement_timeout(seconds=None, using=None):
+    """
+    Abort any query on the ``using`` connection (STATS_DATABASE by default)
+    that runs longer than ``seconds`` (STATS_QUERY_TIMEOUT by default) within
+    the block.
+
+    Uses ``statement_timeout`` on PostgreSQL, ``max_execution_time`` on MySQL
+    (``max_statement_time`` on MariaDB) and a progress handler on SQLite; on
+    other backends queries are not bounded. The aborted query raises
+    ``OperationalError``. The session's previous limit is restored on exit,
+    so nested blocks each bound their own queries and leave the outer
+    block's limit in place.
+
+    On PostgreSQL the block runs in a savepoint (or a transaction, in
+    autocommit mode): a cancelled query aborts the transaction it runs in,
+    and rolling back to the savepoint is what lets the limit be restored.
+    """
+    if seconds is None:
+        seconds = STATS_QUERY_TIMEOUT
+    if not seconds:
+        yield
+        return
+
+    using = using or app_settings.STATS_DATABASE
+    connection = connections[using]
+    if connection.vendor == 'sqlite':
+        connection.ensure_connection()
+        # A connection has a single progress handler, so nested blocks share
+        # it, and it aborts at the earliest deadline of the blocks still open
+        deadlines = connection.__dict__.setdefault('_edx_stats_deadlines', [])
+        deadline = time.monotonic() + seconds
+        deadlines.append(deadline)
+        connection.connection.set_progress_handler(lambda: time.monotonic() > min(deadlines), SQLITE_PROGRESS_STEPS)
+        try:
+            yield
+        finally:
+            deadlines.remove(deadline)
+            if not deadlines and connection.connection is not None:
+                connection.connection.set_progress_handler(None, 0)
+        return
+
+    block = nullcontext()
+    if connection.vendor == 'postgresql':
+        show, set_ = 'SHOW statement_timeout', 'SET statement_timeout = %s'
+        value = int(seconds * 1000)
+        block = transaction.atomic(using=using)
+    elif connection.vendor == 'mysql' and connection.mysql_is_mariadb:
+        show, set_ = 'SELECT @@SESSION.max_statement_time', 'SET SESSION max_statement_time = %s'
+        value = seconds
+    elif connection.vendor == 'mysql':
+        show, set_ = 'SELECT @@SESSION.max_execution_time', 'SET SESSION max_execution_time = %s'
+        value = int(seconds * 1000)
+    else:
+        yield
+        return
+
+    with connection.cursor() as cursor:
+        cursor.execute(show)
+        previous = cursor.fetchone()[0]
+        cursor.execute(set_, [value])
+    try:
+        with block:
+            yield
+    finally:
+        with connection.cursor() as cursor:
+            cursor.execute(set_, [previous])
+
+
+def _call(function):
+    """Run ``function`` on a pool thread, then close that thread's connections."""
+    _pool_thread.active = True
+    try:
+        return function()
+    finally:
+        _pool_thread.active = False
+        connections.close_all()
+
+
+def run_concurrently(functions):
+    """
+    Call every function of ``functions`` concurrently.
+
+    When called from a stat already running on the pool, such as a
+    platform-wide stat combining the value of every shard, the functions are
+    called one after the other on the same thread instead: waiting on the
+    pool from one of its own threads can leave every thread waiting.
+
+    Args:
+        functions (dict): Callables, by key
+
+    Returns:
+        dict: Each callable's result, by key, leaving out the callables that
+            raised StatsUnavailable
+
+    Raises:
+        The first other exception raised by a callable, once all have finished
+    """
+    if len(functions) == 1 or getattr(_pool_thread, 'active', False):
+        calls = functions
+    else:
+        calls = {key: _executor.submit(_call, function).result for key, function in functions.items()}
+    results = {}
+    for key, call in calls.items():
+        try:
+            results[key] = call()
+        except StatsUnavailable:
+            pass
+    return results
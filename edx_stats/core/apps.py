@@ -3,4 +3,11 @@ from django.apps import AppConfig
 
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'core'
\ No newline at end of file
+    name = 'edx_stats.core'
+    label = 'core'
+
+    def ready(self):
+        """
+        Connect the summary table signal handlers when the app is ready.
+        """
+        from . import signals  # pylint: disable=unused-import
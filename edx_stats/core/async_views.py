@@ -0,0 +1,188 @@
+"""
+Async variants of the HTMX partial views, for LMS deployments served over ASGI.
+
+Django 3.2 only supports async function views, so these mirror the
+class-based views in ``core.views``. The cache and database work still runs
+in sync code, on executor threads, but no more than
+STATS_ASYNC_CONCURRENCY statistics are computed at once per worker: while
+they run, further requests wait on the event loop instead of each pinning a
+thread. ``core.urls`` routes the HTMX endpoints here when STATS_ASYNC_VIEWS
+is set.
+"""
+import asyncio
+import weakref
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from crum import set_current_request
+from django.core.exceptions import PermissionDenied
+from django.db import connections
+from django.http import Http404
+from django.shortcuts import render
+
+from .. import app_settings
+from ..views import get_stats, get_stats_many, get_stats_validators, not_modified_response, set_validators
+from .views import (
+    DASHBOARD_WIDGETS,
+    diagnostics_enabled,
+    get_diagnostics,
+    get_series_context,
+    logger,
+    render_dashboard_error,
+    render_dashboard_widgets,
+)
+
+# Semaphore bounding concurrent computations, per event loop: an asyncio
+# semaphore can only be awaited from the loop it was first used on
+_slots = weakref.WeakKeyDictionary()
+
+
+def _get_slots():
+    """Get the running event loop's semaphore, created on first use."""
+    loop = asyncio.get_running_loop()
+    slots = _slots.get(loop)
+    if slots is None:
+        slots = _slots[loop] = asyncio.Semaphore(app_settings.STATS_ASYNC_CONCURRENCY)
+    return slots
+
+
+# Whether the current request already holds a slot
+_holding_slot = ContextVar('holding_slot', default=False)
+
+
+@asynccontextmanager
+async def _slot():
+    """
+    Hold a slot for the rest of the block, unless the current request
+    already holds one: a request never waits for a second slot while keeping
+    its first.
+    """
+    if _holding_slot.get():
+        yield
+        return
+    async with _get_slots():
+        token = _holding_slot.set(True)
+        try:
+            yield
+        finally:
+            _holding_slot.reset(token)
+
+
+def _call(request, function, *args):
+    """
+    Run ``function`` on an executor thread, with ``request`` as the current
+    request (for the site name), then close that thread's connections.
+    """
+    set_current_request(request)
+    try:
+        return function(*args)
+    finally:
+        set_current_request(None)
+        connections.close_all()
+
+
+async def _run(request, function, *args):
+    """Await ``function(*args)``, waiting for a free slot first."""
+    async with _slot():
+        return await sync_to_async(_call, thread_sensitive=False)(request, function, *args)
+
+
+def _is_staff(request):
+    """Load the user from the session; must not run on the event loop."""
+    return request.user.is_authenticated and request.user.is_staff
+
+
+def staff_required(view):
+    """Async counterpart of ``core.views.StaffRequiredMixin``."""
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if not await sync_to_async(_is_staff)(request):
+            if request.headers.get('HX-Request'):
+                # For HTMX requests, return a specific error message
+                return render(request, 'core/partials/permission_denied.html', status=403)
+            raise PermissionDenied("You must be a staff member to access this page.")
+        return await view(request, *args, **kwargs)
+    return wrapper
+
+
+def conditional_stats(*key_suffixes):
+    """Async counterpart of ``edx_stats.views.ConditionalStatsMixin``, for the stats ``key_suffixes``."""
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            # Computing the validators reads the stats the view shows, so one
+            # slot covers both
+            async with _slot():
+                try:
+                    validators = await _run(request, get_stats_validators, list(key_suffixes))
+                except Exception:  # pylint: disable=broad-except
+                    validators = (None, None)
+                response = not_modified_response(request, validators) or await view(request, *args, **kwargs)
+            return set_validators(response, validators)
+        return wrapper
+    return decorator
+
+
+@staff_required
+@conditional_stats('course_stats_top')
+async def htmx_course_list(request):
+    """HTMX view for course list"""
+    courses = await _run(request, get_stats, 'course_stats_top')
+    return render(request, 'core/partials/course_list.html', {'courses': courses})
+
+
+@staff_required
+@conditional_stats('country_stats_top')
+async def htmx_country_list(request):
+    """HTMX view for country list"""
+    countries = await _run(request, get_stats, 'country_stats_top')
+    return render(request, 'core/partials/country_list.html', {'countries': countries})
+
+
+@staff_required
+@conditional_stats('yearly_stats')
+async def htmx_yearly_stats(request):
+    """HTMX view for yearly stats"""
+    yearly_stats = await _run(request, get_stats, 'yearly_stats')
+    return render(request, 'core/partials/yearly_stats.html', {'yearly_stats': yearly_stats})
+
+
+@staff_required
+@conditional_stats(*DASHBOARD_WIDGETS)
+async def htmx_dashboard(request):
+    """HTMX view filling every dashboard widget from a single request"""
+    try:
+        stats = await _run(request, get_stats_many, list(DASHBOARD_WIDGETS))
+    except Exception as e:
+        return render_dashboard_error(request, e)
+    return render(request, 'core/partials/dashboard_widgets.html', {
+        'widgets': render_dashboard_widgets(request, stats),
+    })
+
+
+@staff_required
+@conditional_stats('total_stats')
+async def htmx_dashboard_stats(request):
+    """HTMX view for dashboard stats"""
+    try:
+        total_stats = await _run(request, get_stats, 'total_stats')
+    except Exception as e:
+        logger.error(f"Error in dashboard stats: {str(e)}")
+        return render(request, 'core/partials/dashboard_stats.html', {'error': str(e)})
+    return render(request, 'core/partials/dashboard_stats.html', total_stats)
+
+
+@staff_required
+async def htmx_series(request):
+    """HTMX view for the recent new users and enrollments, per day, week or month"""
+    return render(request, 'core/partials/series.html', await _run(request, get_series_context, request))
+
+
+@staff_required
+async def htmx_dashboard_diagnostics(request):
+    """HTMX view comparing the user count from several query paths, uncached"""
+    if not diagnostics_enabled():
+        raise Http404
+    return render(request, 'core/partials/dashboard_diagnostics.html', await _run(request, get_diagnostics))
@@ -0,0 +1,276 @@
+"""
+Chunked, resumable rebuild of the summary tables, run by ``rebuild_stats``
+and, to seed them, by ``precompute_stats``.
+
+Rather than counting each source table with one ``GROUP BY`` and
+replacing the summary tables in one transaction, a long scan of the
+enrollment table and a long lock on the summary tables on a large
+platform, :func:`backfill` walks ``CourseEnrollment``, ``User`` and
+``UserProfile`` by primary key ranges of STATS_REBUILD_CHUNK_SIZE, each
+counted by its own short query, and adds the counts up in memory. After
+each chunk, the position and counts so far are saved in a
+``RebuildCheckpoint``, so an interrupted run picks up where it stopped, as
+long as it stopped less than STATS_REBUILD_CHECKPOINT_MAX_AGE seconds ago.
+Once every table is walked, the summary rows are updated, created and
+deleted in batches of STATS_REBUILD_BATCH_SIZE, each in its own
+transaction, with ``UserStats`` last, since it marks the tables as seeded.
+
+Sleeping STATS_REBUILD_SLEEP seconds after every chunk and batch throttles
+the load on the primary. Rows created during the walk are counted when it
+reaches them, and the signal deltas to the rows it has already passed are
+added to its counts, so the summary rows are written with the changes made
+during the rebuild rather than losing them. The user and yearly deltas still
+queued for :func:`materialize.flush_deltas` are dropped as those rows are
+written, since the counts include them.
+"""
+import logging
+import time
+from collections import Counter
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import Count, Max, Min
+from django.db.models.functions import ExtractYear
+from django.utils import timezone
+from openedx.core.djangoapps.content.course_overviews.models import CourseOverview
+from common.djangoapps.student.models import CourseEnrollment, UserProfile
+
+from .. import app_settings
+from . import materialize
+from .models import CourseStats, CountryStats, PendingDelta, RebuildCheckpoint, UserStats, YearlyStats
+
+logger = logging.getLogger(__name__)
+
+User = get_user_model()
+
+
+def _add(counts, name, rows):
+    """Add ``(key, count)`` rows to the JSON counts ``name``, whose keys are strings."""
+    totals = Counter(counts.get(name, {}))
+    for key, count in rows:
+        totals[str(key)] += count
+    counts[name] = dict(totals)
+
+
+def _count_enrollments(chunk, counts):
+    rows = list(chunk.annotate(
+        year=ExtractYear('created')
+    ).values_list('course_id', 'year').annotate(count=Count('id')).order_by())
+    _add(counts, 'courses', ((course_id, count) for course_id, _, count in rows))
+    _add(counts, 'years', ((year, count) for _, year, count in rows))
+
+
+def _count_users(chunk, counts):
+    rows = list(chunk.annotate(
+        year=ExtractYear('date_joined')
+    ).values_list('year').annotate(count=Count('id')).order_by())
+    _add(counts, 'years', rows)
+    counts['total'] = counts.get('total', 0) + sum(count for _, count in rows)
+
+
+def _count_profiles(chunk, counts):
+    _add(counts, 'countries', chunk.exclude(
+        country__isnull=True
+    ).exclude(
+        country=''
+    ).values_list('country').annotate(count=Count('id')).order_by())
+
+
+# Checkpoint position of a source walked to its end
+WALKED = 2 ** 63 - 1
+
+# Model and chunk counting function of each source table, in walk order
+SOURCES = {
+    'enrollments': (CourseEnrollment, _count_enrollments),
+    'users': (User, _count_users),
+    'profiles': (UserProfile, _count_profiles),
+}
+
+
+def walk(source, chunk_size, sleep=0, progress=None):
+    """
+    Count a source table chunk by chunk, from its checkpoint on, until the
+    walk reaches its newest row.
+
+    Until :func:`backfill` deletes the checkpoint, the signal deltas to the
+    rows the walk has passed, and to every row once it is done, are added
+    to its counts (``materialize._record``), so they stay current.
+
+    Args:
+        source (str): A key of SOURCES
+        chunk_size (int): Primary keys counted per query
+        sleep (float): Seconds to sleep after each chunk
+        progress (callable): Called with the source, position and last
+            primary key after each chunk
+
+    Returns:
+        dict: The counts of the whole table so far
+    """
+    model, count_chunk = SOURCES[source]
+    rows = model.objects.using(DEFAULT_DB_ALIAS)
+    checkpoint, created = RebuildCheckpoint.objects.get_or_create(source=source)
+    if created:
+        first_id = rows.aggregate(first_id=Min('pk'))['first_id']
+        checkpoint.position = first_id - 1 if first_id else 0
+        checkpoint.save(update_fields=['position'])
+    while True:
+        # Locked while counting, so the deltas to the chunk's rows are
+        # recorded after it is counted, into counts that include it
+        with transaction.atomic():
+            checkpoint = RebuildCheckpoint.objects.select_for_update().get(pk=checkpoint.pk)
+            # Read again for each chunk, to count the rows created during the walk
+            last_id = rows.aggregate(last_id=Max('pk'))['last_id'] or 0
+            if checkpoint.position >= last_id:
+                # Every later change is recorded by the deltas
+                checkpoint.position = WALKED
+                checkpoint.save(update_fields=['position', 'last_updated'])
+                return checkpoint.counts
+            end = checkpoint.position + chunk_size
+            count_chunk(rows.filter(pk__gt=checkpoint.position, pk__lte=end), checkpoint.counts)
+            checkpoint.position = end
+            checkpoint.save(update_fields=['position', 'counts', 'last_updated'])
+        if progress:
+            progress(source, min(end, last_id), last_id)
+        time.sleep(sleep)
+
+
+def _batches(items, batch_size):
+    for start in range(0, len(items), batch_size):
+        yield items[start:start + batch_size]
+
+
+def _locked_counts():
+    """
+    Lock the checkpoint of every source until the transaction ends, and get
+    their counts, by source.
+    """
+    return {
+        checkpoint.source: checkpoint.counts
+        for checkpoint in RebuildCheckpoint.objects.select_for_update().order_by('source')
+    }
+
+
+def sync_rows(model, key_field, get_rows, batch_size, sleep=0, get_pending=None):
+    """
+    Make the rows of ``model`` match ``get_rows`` in batches of
+    ``batch_size``: update the rows that exist, create the missing ones and
+    delete the rest.
+
+    Each batch is written in its own transaction, which locks the
+    checkpoints and reads ``get_rows`` from their counts again, so the
+    deltas recorded since are written with it, and the deltas waiting on
+    the lock land on top of it.
+
+    Django 3.2 has no ``bulk_create(update_conflicts=True)``, so existing
+    rows are found by ``key_field`` and updated with ``bulk_update``.
+
+    Args:
+        model: A summary table model
+        key_field (str): The model's unique field
+        get_rows (callable): Gets the values of the other fields, by
+            ``key_field`` value, from the counts of each source
+        get_pending (callable): Gets the ``PendingDelta`` rows of a batch of
+            keys, which the counts already include, so they are deleted as
+            the batch is written rather than flushed on top of it
+    """
+    with transaction.atomic():
+        keys = list(get_rows(_locked_counts()))
+    fields = None
+    for batch in _batches(keys, batch_size):
+        with transaction.atomic():
+            rows = get_rows(_locked_counts())
+            if get_pending is not None:
+                get_pending(batch).delete()
+            now = timezone.now()
+            existing = dict(model.objects.filter(**{f'{key_field}__in': batch}).values_list(key_field, 'pk'))
+            fields = fields or [*rows[batch[0]], 'last_updated']
+            model.objects.bulk_update([
+                model(pk=existing[key], **{key_field: key}, **rows[key], last_updated=now)
+                for key in batch if key in existing
+            ], fields)
+            model.objects.bulk_create([model(**{key_field: key}, **rows[key]) for key in batch if key not in existing])
+        time.sleep(sleep)
+
+    with transaction.atomic():
+        rows = get_rows(_locked_counts())
+        stale = [pk for key, pk in model.objects.values_list(key_field, 'pk') if key not in rows]
+    for batch in _batches(stale, batch_size):
+        model.objects.filter(pk__in=batch).delete()
+        time.sleep(sleep)
+
+
+def backfill(chunk_size=None, batch_size=None, sleep=None, restart=False, progress=None):
+    """
+    Rebuild the course, country, yearly and user summary tables, resuming
+    an interrupted run unless ``restart`` is set or it stopped more than
+    STATS_REBUILD_CHECKPOINT_MAX_AGE seconds ago.
+
+    ``chunk_size``, ``batch_size`` and ``sleep`` default to
+    STATS_REBUILD_CHUNK_SIZE, STATS_REBUILD_BATCH_SIZE and
+    STATS_REBUILD_SLEEP; ``progress`` is passed to :func:`walk`.
+
+    Returns:
+        dict: The number of rows written to each summary table, by model name
+    """
+    chunk_size = chunk_size or app_settings.STATS_REBUILD_CHUNK_SIZE
+    batch_size = batch_size or app_settings.STATS_REBUILD_BATCH_SIZE
+    sleep = app_settings.STATS_REBUILD_SLEEP if sleep is None else sleep
+    stale = RebuildCheckpoint.objects.filter(
+        last_updated__lt=timezone.now() - timedelta(seconds=app_settings.STATS_REBUILD_CHECKPOINT_MAX_AGE)
+    )
+    if restart or stale.exists():
+        # The counts of an old run miss every change to the rows it had passed
+        RebuildCheckpoint.objects.all().delete()
+    logger.info("Backfilling edx_stats summary tables")
+
+    for source in SOURCES:
+        walk(source, chunk_size, sleep, progress)
+
+    course_names = {
+        str(course_id): display_name or str(course_id)
+        for course_id, display_name in CourseOverview.objects.using(DEFAULT_DB_ALIAS).values_list(
+            'id', 'display_name'
+        ).iterator(chunk_size=chunk_size)
+    }
+
+    def get_courses(counts):
+        enrollments = counts['enrollments'].get('courses', {})
+        return {
+            course_id: {'display_name': display_name, 'enrollment_count': enrollments.get(course_id, 0)}
+            for course_id, display_name in course_names.items()
+        }
+
+    def get_countries(counts):
+        return {
+            code: {'country_name': materialize._country_name(code), 'user_count': user_count}
+            for code, user_count in counts['profiles'].get('countries', {}).items()
+        }
+
+    def get_years(counts):
+        new_users = counts['users'].get('years', {})
+        new_enrollments = counts['enrollments'].get('years', {})
+        return {
+            int(year): {'new_users': new_users.get(year, 0), 'new_enrollments': new_enrollments.get(year, 0)}
+            for year in new_users.keys() | new_enrollments.keys()
+        }
+
+    sync_rows(CourseStats, 'course_id', get_courses, batch_size, sleep)
+    sync_rows(CountryStats, 'country_code', get_countries, batch_size, sleep)
+    sync_rows(
+        YearlyStats, 'year', get_years, batch_size, sleep,
+        lambda years: PendingDelta.objects.filter(year__in=years).exclude(field='total_users'),
+    )
+    with transaction.atomic():
+        counts = _locked_counts()
+        PendingDelta.objects.filter(field='total_users').delete()
+        total_users = counts['users'].get('total', 0)
+        if not UserStats.objects.update(total_users=total_users, last_updated=timezone.now()):
+            UserStats.objects.create(total_users=total_users)
+        RebuildCheckpoint.objects.all().delete()
+    return {
+        'CourseStats': len(course_names),
+        'CountryStats': len(get_countries(counts)),
+        'YearlyStats': len(get_years(counts)),
+        'UserStats': 1,
+    }
@@ -0,0 +1,123 @@
+"""
+Asynchronous recompute jobs started from the dashboard's refresh button.
+
+A job recomputes every stat in ``edx_stats.views.STATS_FUNCTIONS`` on a
+background thread and records the status of each one in the cache, so that
+any worker can report its progress while the request that started it has
+long returned.
+"""
+import logging
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+
+from .. import cache as stats_cache, sites
+from ..views import STATS_COMBINERS, STATS_FUNCTIONS, compute_stats
+
+logger = logging.getLogger(__name__)
+
+PENDING = 'pending'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+JOB_CACHE_KEY_PREFIX = f'{stats_cache.STATS_CACHE_KEY_PREFIX}refresh_job:'
+
+# How long (in seconds) a finished job's progress stays available
+JOB_TIMEOUT = 3600
+
+# How long (in seconds) a running job is tracked without a heartbeat, which
+# it sends before each stat; each recompute is bounded by the lock timeout
+JOB_HEARTBEAT_TIMEOUT = stats_cache.STATS_CACHE_LOCK_TIMEOUT
+
+_executor = ThreadPoolExecutor(
+    max_workers=getattr(settings, 'STATS_REFRESH_WORKERS', 2),
+    thread_name_prefix='edx-stats-refresh',
+)
+
+
+def _job_key(job_id):
+    return f'{JOB_CACHE_KEY_PREFIX}{job_id}'
+
+
+def _active_job_key(scope):
+    return f'{JOB_CACHE_KEY_PREFIX}active:{sites.scope_key(scope)}'
+
+
+def get_job(job_id):
+    """
+    Get the status of each stat of a job, in recompute order, or None if the
+    job is unknown or expired.
+    """
+    return cache.get(_job_key(job_id))
+
+
+def start_refresh(scope):
+    """
+    Queue a recompute of every stat for a ``sites.Scope`` and return its job id.
+
+    While a job for the scope is still running, its id is returned instead of
+    queueing another one. A job whose process died stops being tracked once
+    its heartbeat expires, after JOB_HEARTBEAT_TIMEOUT seconds.
+    """
+    job_id = uuid.uuid4().hex
+    if not cache.add(_active_job_key(scope), job_id, JOB_HEARTBEAT_TIMEOUT):
+        active_job_id = cache.get(_active_job_key(scope))
+        if active_job_id and get_job(active_job_id):
+            return active_job_id
+        cache.set(_active_job_key(scope), job_id, JOB_HEARTBEAT_TIMEOUT)
+
+    cache.set(_job_key(job_id), {key: PENDING for key in STATS_FUNCTIONS}, JOB_HEARTBEAT_TIMEOUT)
+    _executor.submit(_run, job_id, scope)
+    return job_id
+
+
+def _heartbeat(job_id, scope, statuses):
+    """Publish the job's statuses, keeping it and the scope's active job key for another JOB_HEARTBEAT_TIMEOUT."""
+    cache.set(_job_key(job_id), statuses, JOB_HEARTBEAT_TIMEOUT)
+    cache.set(_active_job_key(scope), job_id, JOB_HEARTBEAT_TIMEOUT)
+
+
+def _refresh(key_suffix, scope):
+    """Recompute a stat for a scope and cache it."""
+    stats_cache.set_cached_stats(stats_cache.get_cache_key(key_suffix, scope), compute_stats(key_suffix, scope))
+
+
+def _run(job_id, scope):
+    """
+    Recompute each stat in turn, publishing its status as it changes.
+
+    Each publication while the job runs is its heartbeat: the job and the
+    scope's active job key expire JOB_HEARTBEAT_TIMEOUT seconds after it,
+    and only the final one keeps the job for JOB_TIMEOUT.
+
+    On multi-site installs the platform value of the stats in STATS_COMBINERS
+    is combined from the cached value of every shard, so for the platform
+    those are recomputed first, as ``precompute_stats`` does.
+    """
+    # The queued job may have been evicted from the cache meanwhile
+    statuses = get_job(job_id) or {key: PENDING for key in STATS_FUNCTIONS}
+    try:
+        for key_suffix in STATS_FUNCTIONS:
+            statuses[key_suffix] = RUNNING
+            _heartbeat(job_id, scope, statuses)
+            try:
+                if scope == sites.PLATFORM and key_suffix in STATS_COMBINERS:
+                    for shard in sites.get_shards():
+                        if shard != sites.PLATFORM:
+                            _refresh(key_suffix, shard)
+                            _heartbeat(job_id, scope, statuses)
+                _refresh(key_suffix, scope)
+                statuses[key_suffix] = DONE
+            except Exception:  # pylint: disable=broad-except
+                logger.exception("Refreshing %s failed", key_suffix)
+                statuses[key_suffix] = FAILED
+    finally:
+        cache.set(_job_key(job_id), statuses, JOB_TIMEOUT)
+        if cache.get(_active_job_key(scope)) == job_id:
+            cache.delete(_active_job_key(scope))
+        # This thread's connections are not closed by the request cycle.
+        connections.close_all()
@@ -0,0 +1,279 @@
+"""
+Incremental maintenance of the summary tables in ``core.models``.
+
+The dashboard statistics used to be computed with a ``GROUP BY`` over
+``student_courseenrollment`` and ``auth_userprofile`` on every cache miss.
+Instead, the tables below are seeded once by ``core.backfill`` and then
+kept current by applying small deltas from the signal handlers in
+``core.signals``, so reading a statistic is an index lookup on a few hundred
+rows.
+
+Every registration and enrollment would otherwise update the single
+``UserStats`` row and the current year's ``YearlyStats`` row, so those
+deltas are queued as ``PendingDelta`` rows instead and added up by
+:func:`flush_deltas`, STATS_SUMMARY_FLUSH_INTERVAL seconds after the first
+of them. A delta that fails, e.g. on a lock timeout, is logged rather than
+failing the request that made the change, and ``rebuild_stats`` corrects the
+drift.
+"""
+import logging
+from collections import Counter
+
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, IntegrityError, transaction
+from django.db.models import Count, F
+from django.utils import timezone
+from django_countries import countries as country_names
+from openedx.core.djangoapps.content.course_overviews.models import CourseOverview
+from common.djangoapps.student.models import UserProfile
+
+from .. import app_settings
+from .models import CourseStats, CountryStats, PendingDelta, RebuildCheckpoint, UserStats, YearlyStats
+
+FLUSH_PENDING_CACHE_KEY = 'edx_stats:summary_flush_pending'
+
+logger = logging.getLogger(__name__)
+
+
+def is_materialized(using=DEFAULT_DB_ALIAS):
+    """
+    Return True once the summary tables have been seeded by ``backfill``.
+
+    The single ``UserStats`` row doubles as the seed marker, so deltas
+    never create it. Readers pass their own database alias, since a replica
+    only serves the tables once the seed has reached it.
+    """
+    return UserStats.objects.using(using).exists()
+
+
+def _bump(model, lookup, defaults=None, **deltas):
+    """
+    Atomically add ``deltas`` to the row of ``model`` matching ``lookup``.
+
+    The row is created on the first positive delta. Negative deltas against a
+    missing row are dropped, since there is nothing to decrement.
+    """
+    changes = {field: F(field) + delta for field, delta in deltas.items()}
+    changes['last_updated'] = timezone.now()
+    if model.objects.filter(**lookup).update(**changes):
+        return
+    if min(deltas.values()) < 0:
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(**lookup, **(defaults or {}), **deltas)
+    except IntegrityError:
+        # Another worker created the row first; apply the delta to it.
+        model.objects.filter(**lookup).update(**changes)
+
+
+def _record(source, pk, changes):
+    """
+    Add ``changes`` to the counts of a ``backfill`` walking ``source``, when
+    the walk has already passed row ``pk``; rows ahead of it are counted
+    when it reaches them.
+
+    Run in the transaction applying the same delta to the summary tables.
+    The checkpoint stays locked until it commits, and the backfill locks it
+    to count each chunk and to write each batch of summary rows, so a row
+    is written either with the delta counted or before the delta lands on
+    it. A change committed just before its chunk is counted, whose delta
+    is still to run, is counted twice, until the next rebuild.
+
+    Args:
+        source (str): A key of ``backfill.SOURCES``
+        pk: The primary key of the changed source row
+        changes (list): ``(name, key, delta)`` triples, ``key`` being None
+            for a total
+    """
+    checkpoint = RebuildCheckpoint.objects.select_for_update().filter(source=source, position__gte=pk).first()
+    if checkpoint is None:
+        return
+    for name, key, delta in changes:
+        if key is None:
+            checkpoint.counts[name] = checkpoint.counts.get(name, 0) + delta
+        else:
+            totals = checkpoint.counts.setdefault(name, {})
+            totals[str(key)] = totals.get(str(key), 0) + delta
+    checkpoint.save(update_fields=['counts'])
+
+
+def _country_name(code):
+    """Return the display name for a country code."""
+    return country_names.name(code) or code
+
+
+def apply_enrollment_delta(enrollment_id, course_id, created, delta):
+    """
+    Apply an enrollment being added (``delta=1``) or removed (``delta=-1``).
+    """
+    course_id = str(course_id)
+    try:
+        display_name = None
+        if delta > 0 and not CourseStats.objects.filter(course_id=course_id).exists():
+            display_name = CourseOverview.objects.filter(
+                id=course_id
+            ).values_list('display_name', flat=True).first()
+        with transaction.atomic():
+            _record('enrollments', enrollment_id, [
+                ('courses', course_id, delta),
+                *([('years', created.year, delta)] if created is not None else []),
+            ])
+            _bump(
+                CourseStats,
+                {'course_id': course_id},
+                {'display_name': display_name or course_id},
+                enrollment_count=delta,
+            )
+            if created is not None:
+                PendingDelta.objects.create(field='new_enrollments', year=created.year, delta=delta)
+    except DatabaseError:
+        logger.warning("Could not count an enrollment in %s; rebuild_stats corrects it", course_id, exc_info=True)
+        return
+    if created is not None:
+        schedule_flush()
+
+
+def apply_country_change(profile_id, old_country, new_country):
+    """
+    Move one profile from ``old_country`` to ``new_country``.
+
+    Either side may be empty, for a profile that gains or loses its country.
+    """
+    old_country = str(old_country or '')
+    new_country = str(new_country or '')
+    if old_country == new_country:
+        return
+    try:
+        with transaction.atomic():
+            _record('profiles', profile_id, [
+                (name, country, delta)
+                for name, country, delta in (('countries', old_country, -1), ('countries', new_country, 1))
+                if country
+            ])
+            if old_country:
+                _bump(CountryStats, {'country_code': old_country}, user_count=-1)
+            if new_country:
+                _bump(
+                    CountryStats,
+                    {'country_code': new_country},
+                    {'country_name': _country_name(new_country)},
+                    user_count=1,
+                )
+    except DatabaseError:
+        logger.warning("Could not move a profile to %s; rebuild_stats corrects it", new_country, exc_info=True)
+
+
+def apply_user_delta(user_id, date_joined, delta):
+    """
+    Apply a user joining (``delta=1``) or being removed (``delta=-1``).
+    """
+    try:
+        with transaction.atomic():
+            _record('users', user_id, [
+                ('total', None, delta),
+                *([('years', date_joined.year, delta)] if date_joined is not None else []),
+            ])
+            PendingDelta.objects.bulk_create([
+                PendingDelta(field='total_users', delta=delta),
+                *([PendingDelta(field='new_users', year=date_joined.year, delta=delta)] if date_joined else []),
+            ])
+    except DatabaseError:
+        logger.warning("Could not count user %s; rebuild_stats corrects it", user_id, exc_info=True)
+        return
+    schedule_flush()
+
+
+def flush_deltas():
+    """
+    Add the pending deltas to ``UserStats`` and ``YearlyStats``, with one
+    update per row however many registrations and enrollments they add up.
+
+    Before the tables are seeded, the user total deltas are dropped, since
+    the seed counts them.
+
+    Returns:
+        int: The number of deltas added
+    """
+    # Released first, so a delta queued during the flush schedules a new one
+    cache.delete(FLUSH_PENDING_CACHE_KEY)
+    with transaction.atomic():
+        pending = list(PendingDelta.objects.select_for_update().values_list('pk', 'field', 'year', 'delta'))
+        totals = Counter()
+        for _, field, year, delta in pending:
+            totals[field, year] += delta
+        PendingDelta.objects.filter(pk__in=[pk for pk, _, _, _ in pending]).delete()
+        for (field, year), delta in totals.items():
+            if not delta:
+                continue
+            if field == 'total_users':
+                UserStats.objects.update(total_users=F('total_users') + delta, last_updated=timezone.now())
+            else:
+                _bump(YearlyStats, {'year': year}, **{field: delta})
+    return len(pending)
+
+
+def schedule_flush():
+    """
+    Flush the pending deltas STATS_SUMMARY_FLUSH_INTERVAL seconds from now,
+    unless a flush is already scheduled.
+
+    The flush runs as the ``edx_stats.flush_summary_deltas`` Celery task,
+    like the cache invalidations, or right away when it cannot be queued.
+    """
+    interval = app_settings.STATS_SUMMARY_FLUSH_INTERVAL
+    if not cache.add(FLUSH_PENDING_CACHE_KEY, True, interval * 2 or None):
+        return
+    if not interval:
+        flush_deltas()
+        return
+    try:
+        from ..tasks import flush_summary_deltas  # pylint: disable=import-outside-toplevel
+        flush_summary_deltas.apply_async(countdown=interval)
+    except Exception:  # pylint: disable=broad-except
+        logger.warning("Could not queue the summary delta flush; flushing now", exc_info=True)
+        flush_deltas()
+
+
+def source_queries():
+    """
+    Get the course and country aggregates over the source tables, run on the
+    primary by ``topn.reconcile`` when it does not read the summary tables,
+    by name.
+    """
+    return {
+        'courses': CourseOverview.objects.using(DEFAULT_DB_ALIAS).annotate(
+            enrollment_count=Count('courseenrollment')
+        ).values_list('id', 'display_name', 'enrollment_count'),
+        'countries': UserProfile.objects.using(DEFAULT_DB_ALIAS).exclude(
+            country__isnull=True
+        ).exclude(
+            country=''
+        ).values_list('country').annotate(user_count=Count('user')),
+    }
+
+
+def course_stats():
+    """Return course rows ordered by enrollment count."""
+    return CourseStats.objects.using(app_settings.STATS_DATABASE).order_by('-enrollment_count').values(
+        'course_id', 'display_name', 'enrollment_count'
+    )
+
+
+def country_stats():
+    """Return country rows ordered by user count."""
+    return CountryStats.objects.using(app_settings.STATS_DATABASE).filter(user_count__gt=0).order_by('-user_count').values(
+        'country_name', 'user_count', country=F('country_code')
+    )
+
+
+def yearly_stats():
+    """Return per-year new users and enrollments, oldest first."""
+    return list(YearlyStats.objects.using(app_settings.STATS_DATABASE).order_by('year').values(
+        'year', 'new_users', 'new_enrollments'
+    ))
+
+
+def total_users():
+    """Return the maintained user count."""
+    return UserStats.objects.using(app_settings.STATS_DATABASE).values_list('total_users', flat=True).first() or 0
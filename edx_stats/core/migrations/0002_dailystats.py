@@ -0,0 +1,27 @@
+# Generated by Django 3.2.20 on 2026-10-18 08:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('course_id', models.CharField(blank=True, default='', max_length=255)),
+                ('new_users', models.IntegerField(default=0)),
+                ('new_enrollments', models.IntegerField(default=0)),
+                ('last_updated', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'unique_together': {('course_id', 'date')},
+            },
+        ),
+    ]
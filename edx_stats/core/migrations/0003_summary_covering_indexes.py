@@ -0,0 +1,29 @@
+# Generated by Django 3.2.20 on 2026-10-18 08:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_dailystats'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='countrystats',
+            index=models.Index(fields=['-user_count', 'country_code', 'country_name'], name='core_country_users_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='coursestats',
+            index=models.Index(fields=['-enrollment_count', 'course_id', 'display_name'], name='core_course_enrollments_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='coursestats',
+            index=models.Index(fields=['display_name', 'course_id', 'enrollment_count'], name='core_course_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dailystats',
+            index=models.Index(fields=['course_id', 'date', 'new_users', 'new_enrollments'], name='core_daily_counts_idx'),
+        ),
+    ]
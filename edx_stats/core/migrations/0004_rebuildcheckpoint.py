@@ -0,0 +1,23 @@
+# Generated by Django 3.2.20 on 2026-10-18 08:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_summary_covering_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RebuildCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(max_length=32, unique=True)),
+                ('position', models.BigIntegerField(default=0)),
+                ('counts', models.JSONField(default=dict)),
+                ('last_updated', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
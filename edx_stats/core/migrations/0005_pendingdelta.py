@@ -0,0 +1,22 @@
+# Generated by Django 3.2.20 on 2026-10-18 14:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_rebuildcheckpoint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PendingDelta',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('field', models.CharField(max_length=32)),
+                ('year', models.IntegerField(null=True)),
+                ('delta', models.IntegerField()),
+            ],
+        ),
+    ]
@@ -10,6 +10,16 @@ class CourseStats(models.Model):
     enrollment_count = models.IntegerField(default=0)
     last_updated = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        # One per course list ordering, holding every column the list reads so
+        # pages are index-only scans; INCLUDE would only do that on PostgreSQL
+        indexes = [
+            models.Index(fields=['-enrollment_count', 'course_id', 'display_name'],
+                         name='core_course_enrollments_idx'),
+            models.Index(fields=['display_name', 'course_id', 'enrollment_count'],
+                         name='core_course_name_idx'),
+        ]
+
     def __str__(self):
         return f"{self.display_name} ({self.course_id})"
 
@@ -30,6 +40,12 @@ class CountryStats(models.Model):
     user_count = models.IntegerField(default=0)
     last_updated = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['-user_count', 'country_code', 'country_name'],
+                         name='core_country_users_idx'),
+        ]
+
     def __str__(self):
         return f"{self.country_name} ({self.user_count} users)"
 
@@ -42,4 +58,53 @@ class YearlyStats(models.Model):
     last_updated = models.DateTimeField(auto_now=True)
 
     def __str__(self):
-        return f"Stats for {self.year}"
\ No newline at end of file
+        return f"Stats for {self.year}"
+
+class DailyStats(models.Model):
+    """
+    New users and enrollments per day, for one course or, with an empty
+    course_id, for the whole platform (the only rows counting new users)
+    """
+    date = models.DateField()
+    course_id = models.CharField(max_length=255, blank=True, default='')
+    new_users = models.IntegerField(default=0)
+    new_enrollments = models.IntegerField(default=0)
+    last_updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        # Also serves date range reads of one course, or of the platform rows
+        unique_together = ('course_id', 'date')
+        indexes = [
+            models.Index(fields=['course_id', 'date', 'new_users', 'new_enrollments'],
+                         name='core_daily_counts_idx'),
+        ]
+
+    def __str__(self):
+        return f"Stats for {self.course_id or 'all courses'} on {self.date}"
+
+
+class RebuildCheckpoint(models.Model):
+    """
+    Progress of an interrupted ``rebuild_stats`` through one source table:
+    the last primary key counted and the counts so far
+    """
+    source = models.CharField(max_length=32, unique=True)
+    position = models.BigIntegerField(default=0)
+    counts = models.JSONField(default=dict)
+    last_updated = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Rebuild of {self.source} at id {self.position}"
+
+
+class PendingDelta(models.Model):
+    """
+    A registration or enrollment change not yet added to the user total
+    (``field`` 'total_users', no year) or to a year's ``YearlyStats``
+    """
+    field = models.CharField(max_length=32)
+    year = models.IntegerField(null=True)
+    delta = models.IntegerField()
+
+    def __str__(self):
+        return f"{self.delta:+d} {self.field} {self.year or ''}".rstrip()
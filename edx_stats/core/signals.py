@@ -0,0 +1,78 @@
+"""
+Signal handlers that keep the ``core.models`` summary tables and the
+``core.topn`` counters current.
+
+Each handler applies its delta after the surrounding transaction commits, so
+a rolled back enrollment or registration is never counted.
+"""
+from functools import partial
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from common.djangoapps.student.models import CourseEnrollment, UserProfile
+
+from . import materialize, topn
+
+User = get_user_model()
+
+
+@receiver(post_save, sender=CourseEnrollment)
+def count_enrollment(sender, instance, created, **kwargs):
+    """Count a new enrollment for its course and year."""
+    if created:
+        transaction.on_commit(partial(
+            materialize.apply_enrollment_delta, instance.pk, instance.course_id, instance.created, 1
+        ))
+        transaction.on_commit(partial(topn.apply_enrollment_delta, instance.course_id, 1))
+
+
+@receiver(post_delete, sender=CourseEnrollment)
+def uncount_enrollment(sender, instance, **kwargs):
+    """Remove a deleted enrollment from its course and year."""
+    transaction.on_commit(partial(
+        materialize.apply_enrollment_delta, instance.pk, instance.course_id, instance.created, -1
+    ))
+    transaction.on_commit(partial(topn.apply_enrollment_delta, instance.course_id, -1))
+
+
+@receiver(post_save, sender=User)
+def count_user(sender, instance, created, **kwargs):
+    """Count a newly registered user. Logins and other updates are ignored."""
+    if created:
+        transaction.on_commit(partial(
+            materialize.apply_user_delta, instance.pk, instance.date_joined, 1
+        ))
+
+
+@receiver(post_delete, sender=User)
+def uncount_user(sender, instance, **kwargs):
+    """Remove a deleted user."""
+    transaction.on_commit(partial(
+        materialize.apply_user_delta, instance.pk, instance.date_joined, -1
+    ))
+
+
+@receiver(post_save, sender=UserProfile)
+def count_profile_country(sender, instance, **kwargs):
+    """
+    Move the profile between countries when its country changed, as stashed
+    by ``edx_stats.signals.remember_profile_country``.
+    """
+    old_country = getattr(instance, '_edx_stats_old_country', '')
+    if str(old_country) != str(instance.country or ''):
+        transaction.on_commit(partial(
+            materialize.apply_country_change, instance.pk, old_country, instance.country
+        ))
+        transaction.on_commit(partial(topn.apply_country_change, old_country, instance.country))
+
+
+@receiver(post_delete, sender=UserProfile)
+def uncount_profile_country(sender, instance, **kwargs):
+    """Remove a deleted profile from its country."""
+    if instance.country:
+        transaction.on_commit(partial(
+            materialize.apply_country_change, instance.pk, instance.country, ''
+        ))
+        transaction.on_commit(partial(topn.apply_country_change, instance.country, ''))
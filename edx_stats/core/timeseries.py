@@ -0,0 +1,199 @@
+"""
+Daily, weekly and monthly series of new users and enrollments, overall and
+per course.
+
+Closed days are pre-aggregated into ``DailyStats`` buckets by
+:func:`update_buckets` (run by ``precompute_stats``), so a series reads one
+row per day from the ``(course_id, date)`` index. Only the days after the
+last bucket, normally just today, are counted live, with a range filter on
+the indexed ``created`` and ``date_joined`` columns rather than a function of
+them.
+
+A series is not cached, but :func:`get_series_version` changes whenever it
+may have, so the series view can answer unchanged polls with a 304.
+"""
+import datetime
+import time
+from collections import defaultdict
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import Count, Max
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from common.djangoapps.student.models import CourseEnrollment
+
+from .. import app_settings, cache as stats_cache
+from .models import DailyStats
+
+User = get_user_model()
+
+# Supported series intervals
+INTERVALS = ('day', 'week', 'month')
+
+# Longest series window, in days
+MAX_SERIES_DAYS = 366
+
+# Buckets inserted per query
+BUCKET_BATCH_SIZE = 1000
+
+ONE_DAY = datetime.timedelta(days=1)
+
+# Time the buckets last changed
+BUCKETS_UPDATED_CACHE_KEY = 'edx_stats:series_buckets_updated'
+
+
+def _day_start(day):
+    """Get the start of ``day`` in the current time zone."""
+    return timezone.make_aware(datetime.datetime.combine(day, datetime.time.min))
+
+
+def period_start(interval, day):
+    """Get the first day of the week (Monday) or month containing ``day``."""
+    if interval == 'week':
+        return day - datetime.timedelta(days=day.weekday())
+    if interval == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def count_days(start=None, end=None, using=None):
+    """
+    Count new users and enrollments per day, overall and per course.
+
+    Args:
+        start (date): First day to count, default the beginning
+        end (date): Day after the last one to count, default none
+        using (str): Database alias to count on, default STATS_DATABASE
+
+    Returns:
+        dict: ``{'new_users': n, 'new_enrollments': n}`` by ``(course_id,
+            date)``, with an empty course_id for the platform totals
+    """
+    using = using or app_settings.STATS_DATABASE
+    counts = defaultdict(lambda: {'new_users': 0, 'new_enrollments': 0})
+    for name, queryset, field, by_course in (
+        ('new_enrollments', CourseEnrollment.objects.using(using), 'created', True),
+        ('new_users', User.objects.using(using), 'date_joined', False),
+    ):
+        if start is not None:
+            queryset = queryset.filter(**{f'{field}__gte': _day_start(start)})
+        if end is not None:
+            queryset = queryset.filter(**{f'{field}__lt': _day_start(end)})
+        columns = ['day', 'course_id'] if by_course else ['day']
+        for row in queryset.annotate(
+            day=TruncDate(field)
+        ).values_list(*columns).annotate(count=Count('id')).order_by():
+            day, count = row[0], row[-1]
+            counts[('', day)][name] += count
+            if by_course:
+                counts[(str(row[1]), day)][name] = count
+    return counts
+
+
+def last_bucket_date(using=None):
+    """Get the last day with buckets, or None before the first update."""
+    return DailyStats.objects.using(using or app_settings.STATS_DATABASE).filter(
+        course_id=''
+    ).aggregate(last=Max('date'))['last']
+
+
+def update_buckets():
+    """
+    Bucket every closed day that is not bucketed yet.
+
+    Buckets are written, and their source rows read, on the primary. Every
+    closed day gets a platform row, even without activity, so the next
+    update starts after it.
+
+    Returns:
+        int: The number of days bucketed
+    """
+    today = timezone.localdate()
+    last = last_bucket_date(DEFAULT_DB_ALIAS)
+    start = last + ONE_DAY if last else None
+    if start is not None and start >= today:
+        return 0
+    counts = count_days(start, today, using=DEFAULT_DB_ALIAS)
+    if start is None:
+        start = min((day for _, day in counts), default=today)
+
+    day = start
+    while day < today:
+        counts.setdefault(('', day), {'new_users': 0, 'new_enrollments': 0})
+        day += ONE_DAY
+    DailyStats.objects.bulk_create(
+        [
+            DailyStats(course_id=course_id, date=day, **values)
+            for (course_id, day), values in counts.items()
+        ],
+        batch_size=BUCKET_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+    transaction.on_commit(lambda: cache.set(BUCKETS_UPDATED_CACHE_KEY, time.time(), None))
+    return (today - start).days
+
+
+def rebuild():
+    """Recompute every bucket from the source tables."""
+    with transaction.atomic():
+        DailyStats.objects.all().delete()
+        update_buckets()
+
+
+def get_series_version():
+    """
+    Get a version of every series, which changes on a new day, when the
+    buckets are updated, and when new users or enrollments invalidate the
+    cached stats (with the stats version, at the end of the coalescing
+    window), rather than counting today's rows to tell.
+    """
+    return timezone.localdate(), cache.get(BUCKETS_UPDATED_CACHE_KEY), stats_cache.get_stats_version()
+
+
+def get_series(interval='day', days=30, course_id=None):
+    """
+    Get new enrollments (and, overall, new users) per period over the last
+    ``days`` days, today included.
+
+    Args:
+        interval (str): A value of INTERVALS
+        days (int): Length of the window, up to MAX_SERIES_DAYS
+        course_id (str): Only count this course's enrollments
+
+    Returns:
+        list: One dict per period, oldest first, with ``period`` (its first
+            day, clipped to the window), ``new_enrollments`` and, for the
+            overall series, ``new_users``
+    """
+    today = timezone.localdate()
+    start = today - datetime.timedelta(days=days - 1)
+    course_key = str(course_id) if course_id else ''
+
+    per_day = {
+        day: (new_users, new_enrollments)
+        for day, new_users, new_enrollments in DailyStats.objects.using(app_settings.STATS_DATABASE).filter(
+            course_id=course_key, date__gte=start
+        ).values_list('date', 'new_users', 'new_enrollments')
+    }
+    last = last_bucket_date()
+    live_start = max(start, last + ONE_DAY) if last else start
+    for (row_course_key, day), values in count_days(live_start).items():
+        if row_course_key == course_key:
+            per_day[day] = (values['new_users'], values['new_enrollments'])
+
+    series = {}
+    day = start
+    while day <= today:
+        period = max(period_start(interval, day), start)
+        row = series.setdefault(period, {'period': period, 'new_users': 0, 'new_enrollments': 0})
+        new_users, new_enrollments = per_day.get(day, (0, 0))
+        row['new_users'] += new_users
+        row['new_enrollments'] += new_enrollments
+        day += ONE_DAY
+    rows = list(series.values())
+    if course_key:
+        for row in rows:
+            del row['new_users']
+    return rows
@@ -0,0 +1,275 @@
+"""
+Top-N courses and countries from counters kept in Redis sorted sets.
+
+The dashboard only shows the top STATS_DASHBOARD_TOP_ITEMS courses and
+countries. When the default cache is django-redis, the enrollment count of
+every course is kept as its score in a sorted set, one for the platform and
+one per course org, and the user count of every country in another, so a
+top-N read is a ``ZREVRANGE`` of O(log n + N) with no database query.
+
+The signal handlers in ``core.signals`` apply each enrollment and profile
+country change with ``ZINCRBY`` once its transaction commits. Changes that
+are missed, because Redis was unreachable or they landed while the
+counters were being replaced, are corrected by :func:`reconcile`, which
+``precompute_stats`` and ``rebuild_stats`` run after rebuilding the summary
+tables, and the ``reconcile_topn`` command and Celery task on their own.
+The counters are not read until it has run once.
+
+With any other cache, the top-N are read from the ``CourseStats`` and
+``CountryStats`` summary tables, whose descending indexes serve them the
+same way, one index range of N rows.
+"""
+import logging
+from collections import defaultdict
+
+import redis
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from opaque_keys import InvalidKeyError
+from opaque_keys.edx.keys import CourseKey
+from openedx.core.djangoapps.content.course_overviews.models import CourseOverview
+
+from .. import app_settings, sites
+from .. import cache as stats_cache
+from . import materialize
+from .models import CourseStats, CountryStats
+
+logger = logging.getLogger(__name__)
+
+# Kept apart from STATS_CACHE_KEY_PREFIX, so invalidating the stats does not drop the counters
+TOPN_KEY_PREFIX = 'edx_stats_topn:'
+COURSES = 'courses'
+COUNTRIES = 'countries'
+COURSE_NAMES = 'course_names'
+ORGS = 'orgs'
+SEEDED = 'seeded'
+
+
+def _key(name):
+    """Get the Redis key of a counter, with the cache's KEY_PREFIX and version."""
+    return cache.make_key(f'{TOPN_KEY_PREFIX}{name}')
+
+
+def _org_key(org):
+    return _key(f'{COURSES}:{org}')
+
+
+def _text(value):
+    return value.decode() if isinstance(value, bytes) else value
+
+
+def _org(course_id):
+    """Get the org of a course id, or None if it is not a valid course key."""
+    try:
+        return CourseKey.from_string(str(course_id)).org
+    except InvalidKeyError:
+        return None
+
+
+def get_redis():
+    """
+    Get the Redis client of the default cache, or None when the counters are
+    disabled or the cache is not django-redis.
+    """
+    if not app_settings.STATS_TOPN_COUNTERS:
+        return None
+    return stats_cache.get_redis()
+
+
+def is_available():
+    """Return True when the counters are kept in Redis."""
+    return get_redis() is not None
+
+
+def apply_enrollment_delta(course_id, delta):
+    """
+    Apply an enrollment being added (``delta=1``) or removed (``delta=-1``).
+    """
+    client = get_redis()
+    if client is None:
+        return
+    course_id = str(course_id)
+    org = _org(course_id)
+    try:
+        pipe = client.pipeline(transaction=False)
+        pipe.zincrby(_key(COURSES), delta, course_id)
+        if org:
+            pipe.zincrby(_org_key(org), delta, course_id)
+            pipe.sadd(_key(ORGS), org)
+        enrollment_count = pipe.execute()[0]
+        if delta > 0 and enrollment_count == delta:
+            # The course's first enrollment since the counters were seeded
+            display_name = CourseOverview.objects.filter(
+                id=course_id
+            ).values_list('display_name', flat=True).first()
+            client.hsetnx(_key(COURSE_NAMES), course_id, display_name or course_id)
+    except redis.RedisError:
+        logger.warning("Could not count an enrollment in %s; the next reconcile corrects it", course_id, exc_info=True)
+
+
+def apply_country_change(old_country, new_country):
+    """
+    Move one profile from ``old_country`` to ``new_country``.
+
+    Either side may be empty, for a profile that gains or loses its country.
+    """
+    client = get_redis()
+    if client is None:
+        return
+    old_country = str(old_country or '')
+    new_country = str(new_country or '')
+    if old_country == new_country:
+        return
+    try:
+        pipe = client.pipeline(transaction=False)
+        if old_country:
+            pipe.zincrby(_key(COUNTRIES), -1, old_country)
+        if new_country:
+            pipe.zincrby(_key(COUNTRIES), 1, new_country)
+        pipe.execute()
+    except redis.RedisError:
+        logger.warning("Could not move a profile to %s; the next reconcile corrects it", new_country, exc_info=True)
+
+
+def top_courses(scope, count):
+    """
+    Get the ``count`` courses of ``scope`` with the most enrollments.
+
+    A site's courses are read from the sorted set of each of its orgs, whose
+    top ``count`` hold the overall top ``count`` between them.
+
+    Returns:
+        list: Dicts with ``course_id``, ``display_name`` and
+            ``enrollment_count``, or None when the counters are unavailable
+            or not seeded yet
+    """
+    client = get_redis()
+    if client is None:
+        return None
+    try:
+        if scope == sites.PLATFORM:
+            keys = [_key(COURSES)]
+        elif scope.orgs is not None:
+            keys = [_org_key(org) for org in sorted(scope.orgs)]
+        else:
+            orgs = {_text(org) for org in client.smembers(_key(ORGS))} - scope.exclude_orgs
+            keys = [_org_key(org) for org in sorted(orgs)]
+        pipe = client.pipeline(transaction=False)
+        pipe.exists(_key(SEEDED))
+        for key in keys:
+            pipe.zrevrange(key, 0, count - 1, withscores=True)
+        seeded, *ranges = pipe.execute()
+        if not seeded:
+            return None
+        courses = sorted(
+            ((_text(course_id), int(score)) for rows in ranges for course_id, score in rows),
+            key=lambda course: -course[1],
+        )[:count]
+        names = client.hmget(_key(COURSE_NAMES), [course_id for course_id, _ in courses]) if courses else []
+    except redis.RedisError:
+        logger.warning("Could not read the top-N course counters", exc_info=True)
+        return None
+    return [
+        {'course_id': course_id, 'display_name': _text(name) or course_id, 'enrollment_count': enrollment_count}
+        for (course_id, enrollment_count), name in zip(courses, names)
+    ]
+
+
+def top_countries(count):
+    """
+    Get the ``count`` countries with the most users on the platform.
+
+    Returns:
+        list: Dicts with ``country_name``, ``user_count`` and ``country``, or
+            None when the counters are unavailable or not seeded yet
+    """
+    client = get_redis()
+    if client is None:
+        return None
+    try:
+        pipe = client.pipeline(transaction=False)
+        pipe.exists(_key(SEEDED))
+        pipe.zrevrangebyscore(_key(COUNTRIES), '+inf', '(0', start=0, num=count, withscores=True)
+        seeded, countries = pipe.execute()
+    except redis.RedisError:
+        logger.warning("Could not read the top-N country counters", exc_info=True)
+        return None
+    if not seeded:
+        return None
+    return [
+        {'country_name': materialize._country_name(_text(code)), 'user_count': int(score), 'country': _text(code)}
+        for code, score in countries
+    ]
+
+
+def _count_drift(client, key, counts):
+    """Count the members of the sorted set ``key`` whose score differs from ``counts``."""
+    current = {_text(member): int(score) for member, score in client.zrange(key, 0, -1, withscores=True)}
+    return sum(1 for member in current.keys() | counts.keys() if current.get(member, 0) != counts.get(member, 0))
+
+
+def reconcile(summary=False):
+    """
+    Replace the counters with the true counts.
+
+    The counts are aggregated from the source tables on the primary, or read
+    from the summary tables with ``summary=True``, right after they were
+    rebuilt. The counters are replaced in one ``MULTI``/``EXEC``, so readers
+    never see them half written; changes committed between reading the
+    counts and replacing them are lost until the next run.
+
+    Returns:
+        dict: The number of ``courses`` and ``countries`` counters that were
+            wrong, or None when the counters are not kept in Redis
+    """
+    client = get_redis()
+    if client is None:
+        return None
+    if summary:
+        courses = CourseStats.objects.using(DEFAULT_DB_ALIAS).values_list(
+            'course_id', 'display_name', 'enrollment_count'
+        )
+        countries = CountryStats.objects.using(DEFAULT_DB_ALIAS).values_list('country_code', 'user_count')
+    else:
+        queries = materialize.source_queries()
+        courses, countries = queries['courses'], queries['countries']
+
+    course_counts = {}
+    course_names = {}
+    org_counts = defaultdict(dict)
+    for course_id, display_name, enrollment_count in courses:
+        course_id = str(course_id)
+        course_counts[course_id] = enrollment_count
+        course_names[course_id] = display_name or course_id
+        org = _org(course_id)
+        if org:
+            org_counts[org][course_id] = enrollment_count
+    country_counts = {str(code): user_count for code, user_count in countries}
+
+    drift = {
+        'courses': _count_drift(client, _key(COURSES), course_counts),
+        'countries': _count_drift(client, _key(COUNTRIES), country_counts),
+    }
+    old_orgs = {_text(org) for org in client.smembers(_key(ORGS))}
+
+    pipe = client.pipeline(transaction=True)
+    pipe.delete(
+        _key(COURSES), _key(COUNTRIES), _key(COURSE_NAMES), _key(ORGS),
+        *[_org_key(org) for org in old_orgs],
+    )
+    if course_counts:
+        pipe.zadd(_key(COURSES), course_counts)
+        pipe.hset(_key(COURSE_NAMES), mapping=course_names)
+    for org, counts in org_counts.items():
+        pipe.zadd(_org_key(org), counts)
+    if org_counts:
+        pipe.sadd(_key(ORGS), *org_counts)
+    if country_counts:
+        pipe.zadd(_key(COUNTRIES), country_counts)
+    pipe.set(_key(SEEDED), 1)
+    pipe.execute()
+    logger.info(
+        "Reconciled the top-N counters: %d course and %d country counts corrected",
+        drift['courses'], drift['countries'],
+    )
+    return drift
@@ -1,18 +1,45 @@
 from django.urls import path
+from .. import app_settings
 from . import views
 
 app_name = 'core'
 
+if app_settings.STATS_ASYNC_VIEWS:
+    from . import async_views
+    htmx_views = {
+        'htmx_courses': async_views.htmx_course_list,
+        'htmx_countries': async_views.htmx_country_list,
+        'htmx_yearly_stats': async_views.htmx_yearly_stats,
+        'htmx_dashboard': async_views.htmx_dashboard,
+        'htmx_dashboard_stats': async_views.htmx_dashboard_stats,
+        'htmx_dashboard_diagnostics': async_views.htmx_dashboard_diagnostics,
+        'htmx_series': async_views.htmx_series,
+    }
+else:
+    htmx_views = {
+        'htmx_courses': views.HtmxCourseListView.as_view(),
+        'htmx_countries': views.HtmxCountryListView.as_view(),
+        'htmx_yearly_stats': views.HtmxYearlyStatsView.as_view(),
+        'htmx_dashboard': views.HtmxDashboardView.as_view(),
+        'htmx_dashboard_stats': views.HtmxDashboardStatsView.as_view(),
+        'htmx_dashboard_diagnostics': views.HtmxDashboardDiagnosticsView.as_view(),
+        'htmx_series': views.HtmxSeriesView.as_view(),
+    }
+
 urlpatterns = [
     # Main dashboard - the only full page
     path('', views.DashboardView.as_view(), name='dashboard'),
 
     # HTMX endpoints
-    path('htmx/courses/', views.HtmxCourseListView.as_view(), name='htmx_courses'),
-    path('htmx/countries/', views.HtmxCountryListView.as_view(), name='htmx_countries'),
-    path('htmx/yearly-stats/', views.HtmxYearlyStatsView.as_view(), name='htmx_yearly_stats'),
-    path('htmx/dashboard-stats/', views.HtmxDashboardStatsView.as_view(), name='htmx_dashboard_stats'),
+    path('htmx/courses/', htmx_views['htmx_courses'], name='htmx_courses'),
+    path('htmx/countries/', htmx_views['htmx_countries'], name='htmx_countries'),
+    path('htmx/yearly-stats/', htmx_views['htmx_yearly_stats'], name='htmx_yearly_stats'),
+    path('htmx/dashboard/', htmx_views['htmx_dashboard'], name='htmx_dashboard'),
+    path('htmx/dashboard-stats/', htmx_views['htmx_dashboard_stats'], name='htmx_dashboard_stats'),
+    path('htmx/dashboard-stats/debug/', htmx_views['htmx_dashboard_diagnostics'], name='htmx_dashboard_diagnostics'),
+    path('htmx/series/', htmx_views['htmx_series'], name='htmx_series'),
 
     # Data refresh endpoint
     path('refresh/', views.RefreshStatsView.as_view(), name='refresh_stats'),
+    path('refresh/<str:job_id>/', views.RefreshProgressView.as_view(), name='refresh_progress'),
 ]
\ No newline at end of file
@@ -1,22 +1,23 @@
 from django.views.generic import TemplateView, View
-from django.http import HttpResponse, JsonResponse
+from django.http import Http404, HttpResponse, JsonResponse
 from django.shortcuts import render
-from django.utils import timezone
-from django.db.models import Count, Sum
+from django.template.loader import render_to_string
+from django.db.models import Sum
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.contrib.auth import get_user_model
-from django.db.models.functions import ExtractYear
-from django.core.cache import cache
 from django.core.exceptions import PermissionDenied
 import logging
 import redis
 from django.conf import settings
 
-from openedx.core.djangoapps.content.course_overviews.models import CourseOverview
-from common.djangoapps.student.models import CourseEnrollment, UserProfile
+from common.djangoapps.student.models import UserProfile
 from openedx.core.djangoapps.site_configuration import helpers as configuration_helpers
 from common.djangoapps.student.models import User as OpenEdxUser
 
+from . import jobs, timeseries
+from .. import app_settings, replica, sites
+from ..views import ConditionalStatsMixin, get_stats, get_stats_many, get_version_validators
+
 logger = logging.getLogger(__name__)
 
 User = get_user_model()
@@ -64,124 +65,274 @@ class DashboardView(StaffRequiredMixin, TemplateView):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
+        context.update(replica.get_freshness())
         return context
 
 
-class HtmxCourseListView(StaffRequiredMixin, View):
+class HtmxCourseListView(StaffRequiredMixin, ConditionalStatsMixin, View):
     """HTMX view for course list"""
+    stats_keys = ['course_stats_top']
 
     def get(self, request, *args, **kwargs):
-        courses = CourseOverview.objects.annotate(
-            enrollment_count=Count('courseenrollment')
-        ).order_by('-enrollment_count')[:10]
-
+        courses = get_stats('course_stats_top')
         return render(request, 'core/partials/course_list.html', {'courses': courses})
 
 
-class HtmxCountryListView(StaffRequiredMixin, View):
+class HtmxCountryListView(StaffRequiredMixin, ConditionalStatsMixin, View):
     """HTMX view for country list"""
+    stats_keys = ['country_stats_top']
 
     def get(self, request, *args, **kwargs):
-        countries = UserProfile.objects.values(
-            'country'
-        ).annotate(
-            user_count=Count('id')
-        ).filter(
-            user__is_active=True
-        ).exclude(
-            country=''
-        ).order_by('-user_count')[:10]
-
+        countries = get_stats('country_stats_top')
         return render(request, 'core/partials/country_list.html', {'countries': countries})
 
 
-class HtmxYearlyStatsView(StaffRequiredMixin, View):
+class HtmxYearlyStatsView(StaffRequiredMixin, ConditionalStatsMixin, View):
     """HTMX view for yearly stats"""
+    stats_keys = ['yearly_stats']
 
     def get(self, request, *args, **kwargs):
-        yearly_stats = OpenEdxUser.objects.filter(
-            is_active=True
-        ).annotate(
-            year=ExtractYear('date_joined')
-        ).values('year').annotate(
-            new_users=Count('id'),
-            new_enrollments=Count('courseenrollment')
-        ).order_by('year')
-
+        yearly_stats = get_stats('yearly_stats')
         return render(request, 'core/partials/yearly_stats.html', {'yearly_stats': yearly_stats})
 
 
-class HtmxDashboardStatsView(StaffRequiredMixin, View):
+class HtmxDashboardStatsView(StaffRequiredMixin, ConditionalStatsMixin, View):
     """HTMX view for dashboard stats"""
+    stats_keys = ['total_stats']
 
     def get(self, request, *args, **kwargs):
-        # Check Redis connection
-        redis_status = check_redis_connection()
-        logger.info(f"Redis connection status: {redis_status}")
-
-        # Clear cache for user-related queries
-        cache.delete('user_count_cache')
-        cache.delete('course_count_cache')
-        cache.delete('enrollment_count_cache')
-
         try:
-            # Debug the user query with .using('default') to ensure correct database
-            users_query = OpenEdxUser.objects.using('default').filter(is_active=True)
-            logger.info(f"User Query SQL: {str(users_query.query)}")
-            total_users = users_query.count()
-            logger.info(f"Total Users Result: {total_users}")
-
-            # Try direct database query
-            from django.db import connections
-            with connections['default'].cursor() as cursor:
-                cursor.execute("SELECT COUNT(*) FROM auth_user WHERE is_active = true")
-                direct_count = cursor.fetchone()[0]
-                logger.info(f"Direct SQL count: {direct_count}")
-
-            # Also try alternative query without cache
-            auth_user_query = get_user_model().objects.using('default').filter(is_active=True)
-            logger.info(f"Auth User Query SQL: {str(auth_user_query.query)}")
-            auth_total_users = auth_user_query.count()
-            logger.info(f"Auth Total Users Result: {auth_total_users}")
-
-            # Try querying UserProfile as well
-            profile_query = UserProfile.objects.using('default').filter(user__is_active=True)
-            logger.info(f"Profile Query SQL: {str(profile_query.query)}")
-            profile_total = profile_query.count()
-            logger.info(f"Profile Total Result: {profile_total}")
-
-            total_courses = CourseOverview.objects.using('default').filter(ended__isnull=True).count()
-            total_enrollments = CourseEnrollment.objects.using('default').filter(is_active=True).count()
-
-            # Log current user info for debugging
-            logger.info(f"Current user ID: {request.user.id}")
-            logger.info(f"Current user is authenticated: {request.user.is_authenticated}")
-            logger.info(f"Current user is active: {request.user.is_active}")
-            logger.info(f"Current user is staff: {request.user.is_staff}")
-
-            return render(request, 'core/partials/dashboard_stats.html', {
-                'total_users': total_users,
-                'auth_total_users': auth_total_users,
-                'profile_total': profile_total,
-                'direct_count': direct_count,
-                'total_courses': total_courses,
-                'total_enrollments': total_enrollments,
-                'redis_status': redis_status,
-            })
+            total_stats = get_stats('total_stats')
         except Exception as e:
             logger.error(f"Error in dashboard stats: {str(e)}")
-            return render(request, 'core/partials/dashboard_stats.html', {
-                'error': str(e),
-                'redis_status': redis_status
-            })
+            return render(request, 'core/partials/dashboard_stats.html', {'error': str(e)})
+        return render(request, 'core/partials/dashboard_stats.html', total_stats)
 
 
-class RefreshStatsView(StaffRequiredMixin, View):
-    """View for refreshing statistics"""
+def get_diagnostics():
+    """
+    Compare the active user count from several query paths, uncached, and
+    check the Redis connection.
+
+    Returns:
+        dict: The counts and ``redis_status``, or ``error`` if a query failed
+    """
+    # Check Redis connection
+    redis_status = check_redis_connection()
+    logger.info(f"Redis connection status: {redis_status}")
+
+    try:
+        # Debug the user query on the database the stats are read from
+        users_query = OpenEdxUser.objects.using(app_settings.STATS_DATABASE).filter(is_active=True)
+        logger.info(f"User Query SQL: {str(users_query.query)}")
+        total_users = users_query.count()
+        logger.info(f"Total Users Result: {total_users}")
+
+        # Try direct database query
+        from django.db import connections
+        with connections[app_settings.STATS_DATABASE].cursor() as cursor:
+            cursor.execute("SELECT COUNT(*) FROM auth_user WHERE is_active = true")
+            direct_count = cursor.fetchone()[0]
+            logger.info(f"Direct SQL count: {direct_count}")
+
+        # Also try alternative query without cache
+        auth_user_query = get_user_model().objects.using(app_settings.STATS_DATABASE).filter(is_active=True)
+        logger.info(f"Auth User Query SQL: {str(auth_user_query.query)}")
+        auth_total_users = auth_user_query.count()
+        logger.info(f"Auth Total Users Result: {auth_total_users}")
+
+        # Try querying UserProfile as well
+        profile_query = UserProfile.objects.using(app_settings.STATS_DATABASE).filter(user__is_active=True)
+        logger.info(f"Profile Query SQL: {str(profile_query.query)}")
+        profile_total = profile_query.count()
+        logger.info(f"Profile Total Result: {profile_total}")
+
+        return {
+            'total_users': total_users,
+            'auth_total_users': auth_total_users,
+            'profile_total': profile_total,
+            'direct_count': direct_count,
+            'redis_status': redis_status,
+        }
+    except Exception as e:
+        logger.error(f"Error in dashboard diagnostics: {str(e)}")
+        return {
+            'error': str(e),
+            'redis_status': redis_status
+        }
+
+
+def diagnostics_enabled():
+    """Return True when the uncached diagnostics may be served."""
+    return settings.DEBUG or app_settings.STATS_DIAGNOSTICS_ENABLED
+
+
+def get_series_params(request):
+    """
+    Get the interval, days and course id of the series requested by the
+    ``interval``, ``days`` and ``course_id`` query parameters.
+    """
+    interval = request.GET.get('interval')
+    if interval not in timeseries.INTERVALS:
+        interval = 'day'
+    try:
+        days = min(max(int(request.GET.get('days', 30)), 1), timeseries.MAX_SERIES_DAYS)
+    except ValueError:
+        days = 30
+    return interval, days, request.GET.get('course_id') or None
+
+
+def get_series_context(request):
+    """Get the series shown by the series views, see :func:`get_series_params`."""
+    interval, days, course_id = get_series_params(request)
+    return {
+        'interval': interval,
+        'intervals': timeseries.INTERVALS,
+        'days': days,
+        'course_id': course_id,
+        'series': timeseries.get_series(interval, days, course_id),
+    }
+
+
+class HtmxSeriesView(StaffRequiredMixin, ConditionalStatsMixin, View):
+    """HTMX view for the recent new users and enrollments, per day, week or month"""
+
+    def get_validators(self):
+        return get_version_validators(timeseries.get_series_version(), *get_series_params(self.request))
+
+    def get(self, request, *args, **kwargs):
+        return render(request, 'core/partials/series.html', get_series_context(request))
+
+
+class HtmxDashboardDiagnosticsView(StaffRequiredMixin, View):
+    """
+    HTMX view comparing the user count from several query paths, uncached.
+
+    It opens its own Redis connection and runs a handful of full counts, so
+    it is only served when DEBUG or STATS_DIAGNOSTICS_ENABLED is set.
+    """
 
     def get(self, request, *args, **kwargs):
-        # Since we're using direct ORM queries now, we just need to return success
+        if not diagnostics_enabled():
+            raise Http404
+        return render(request, 'core/partials/dashboard_diagnostics.html', get_diagnostics())
+
+
+# Dashboard widget showing each stat:
+# (element id, partial template, context variable or None to use the stat as the context)
+DASHBOARD_WIDGETS = {
+    'total_stats': ('dashboard-stats', 'core/partials/dashboard_stats.html', None),
+    'course_stats_top': ('course-list', 'core/partials/course_list.html', 'courses'),
+    'country_stats_top': ('country-list', 'core/partials/country_list.html', 'countries'),
+    'yearly_stats': ('yearly-stats', 'core/partials/yearly_stats.html', 'yearly_stats'),
+}
+
+
+def render_widgets(request, stats):
+    """
+    Render the dashboard widget of each stat.
+
+    Args:
+        stats (dict): The data of each stat, by key of DASHBOARD_WIDGETS
+
+    Returns:
+        list: ``(element id, html)`` pairs, to swap in out of band
+    """
+    widgets = []
+    for key_suffix, data in stats.items():
+        element_id, template_name, context_name = DASHBOARD_WIDGETS[key_suffix]
+        context = data if context_name is None else {context_name: data}
+        widgets.append((element_id, render_to_string(template_name, context, request=request)))
+    return widgets
+
+
+def render_dashboard_widgets(request, stats):
+    """
+    Render every dashboard widget, with a notice in place of each stat
+    missing from ``stats`` because it could not be computed in time.
+    """
+    widgets = render_widgets(request, stats)
+    for key_suffix, (element_id, _, _) in DASHBOARD_WIDGETS.items():
+        if key_suffix not in stats:
+            widgets.append((element_id, render_to_string('core/partials/stat_unavailable.html', request=request)))
+    return widgets
+
+
+def render_dashboard_error(request, error):
+    """Render the dashboard widgets response for a failure to get the stats."""
+    logger.error(f"Error in dashboard stats: {str(error)}")
+    return render(request, 'core/partials/dashboard_widgets.html', {
+        'widgets': [('dashboard-stats', render_to_string(
+            'core/partials/dashboard_stats.html', {'error': str(error)}, request=request
+        ))],
+    })
+
+
+class HtmxDashboardView(StaffRequiredMixin, ConditionalStatsMixin, View):
+    """
+    HTMX view filling every dashboard widget from a single request.
+
+    The stats are read with one cache round trip and any missing ones are
+    computed concurrently; each widget is then swapped in out of band. A
+    stat that could not be computed in time shows a notice instead.
+    """
+    stats_keys = list(DASHBOARD_WIDGETS)
+
+    def get(self, request, *args, **kwargs):
+        try:
+            stats = get_stats_many(list(DASHBOARD_WIDGETS))
+        except Exception as e:
+            return render_dashboard_error(request, e)
+        return render(request, 'core/partials/dashboard_widgets.html', {
+            'widgets': render_dashboard_widgets(request, stats),
+        })
+
+
+class RefreshStatsView(StaffRequiredMixin, View):
+    """View for refreshing statistics, which only accepts a POST with a CSRF token"""
+
+    def post(self, request, *args, **kwargs):
+        job_id = jobs.start_refresh(sites.get_current_scope())
+        if request.headers.get('HX-Request'):
+            return render(request, 'core/partials/refresh_status.html', {
+                'job_id': job_id,
+                'statuses': jobs.get_job(job_id),
+                'running': True,
+            })
         return JsonResponse({
-            'status': 'success',
-            'message': f"Statistics refreshed at {timezone.now()}"
-        })
\ No newline at end of file
+            'status': 'queued',
+            'job_id': job_id,
+        }, status=202)
+
+
+class RefreshProgressView(StaffRequiredMixin, View):
+    """
+    HTMX view polled for the progress of a refresh job.
+
+    Each stat that finished since the previous poll (those not listed in
+    ``?seen=``) has its dashboard widget swapped in out of band. Polling
+    stops once every stat is done or failed.
+    """
+
+    def get(self, request, job_id, *args, **kwargs):
+        statuses = jobs.get_job(job_id)
+        if statuses is None:
+            return render(request, 'core/partials/refresh_status.html', {'expired': True})
+
+        seen = set(filter(None, request.GET.get('seen', '').split(',')))
+        finished = [
+            key_suffix for key_suffix, status in statuses.items()
+            if status == jobs.DONE and key_suffix not in seen
+        ]
+        seen.update(finished)
+        widgets = render_widgets(request, get_stats_many(
+            [key_suffix for key_suffix in finished if key_suffix in DASHBOARD_WIDGETS]
+        ))
+
+        return render(request, 'core/partials/refresh_status.html', {
+            'job_id': job_id,
+            'statuses': statuses,
+            'running': any(status in (jobs.PENDING, jobs.RUNNING) for status in statuses.values()),
+            'seen': ','.join(sorted(seen)),
+            'widgets': widgets,
+        })
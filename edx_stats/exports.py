@@ -0,0 +1,65 @@
+"""
+Streaming exports of the full stats listings as CSV or NDJSON.
+
+Rows are encoded one at a time as they come out of the database, so memory
+use stays flat however many courses there are and the first bytes reach the
+client before the last rows are read.
+"""
+import csv
+import json
+
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+# Content type of each export format
+FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+class _Echo:
+    """File-like object handing back what the csv writer writes to it."""
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(fields, rows):
+    """Yield a CSV header line, then one line per row."""
+    writer = csv.writer(_Echo())
+    yield writer.writerow(fields)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def ndjson_lines(fields, rows):
+    """Yield one JSON object per row, keyed by ``fields``."""
+    for row in rows:
+        yield json.dumps(dict(zip(fields, row)), default=str) + '\n'
+
+
+def export_lines(fmt, fields, rows):
+    """
+    Encode ``rows`` in the export format ``fmt``, a key of FORMATS.
+
+    Args:
+        fmt (str): 'csv' or 'ndjson'
+        fields (tuple): The name of each row column
+        rows (iterable): Row tuples
+
+    Returns:
+        iterator: The encoded lines
+    """
+    if fmt == 'csv':
+        return csv_lines(fields, rows)
+    return ndjson_lines(fields, rows)
+
+
+def streaming_response(name, fmt, fields, rows):
+    """
+    Stream ``rows`` as a file download named after ``name`` and today's date.
+    """
+    response = StreamingHttpResponse(export_lines(fmt, fields, rows), content_type=FORMATS[fmt])
+    response['Content-Disposition'] = f'attachment; filename="{name}-{timezone.now():%Y-%m-%d}.{fmt}"'
+    return response
@@ -0,0 +1,288 @@
+"""
+Index advisor for the stats queries.
+
+Runs EXPLAIN on every query the stats issue and reports, for each, the
+tables it scans in full, whether it sorts (a filesort, temporary B-tree or
+Sort node), and the indexes it reads, noting those it reads without
+touching the table. It then lists the indexes of the summary tables that no
+query reads, and indexes on the scanned source tables that would serve
+them.
+
+The source tables belong to Open edX, so their indexes are only suggested
+as SQL for an operator to review and apply, never migrated; the summary
+tables' own indexes are in the ``core`` migrations.
+
+The read path is run once, as on a cache miss, with every query bounded by
+STATS_QUERY_TIMEOUT, and its queries are captured as they run. The
+aggregates of the rollup and of the top-N reconcile are only
+explained, since they scan whole tables.
+"""
+import json
+import re
+from collections import namedtuple
+from contextlib import ExitStack
+from functools import partial
+
+from django.apps import apps
+from django.contrib.auth import get_user_model
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+from django.db.models import Index
+from common.djangoapps.student.models import CourseEnrollment, UserProfile
+
+from . import app_settings, compute, rollup, sites, views
+
+User = get_user_model()
+
+# What the plan of one query does
+Plan = namedtuple('Plan', ['full_scans', 'sorts', 'indexes', 'index_only'])
+
+# An explained query: where it is issued, on which database, its SQL and plan
+Explained = namedtuple('Explained', ['source', 'using', 'sql', 'plan'])
+
+# An index on a source table serving a stats query shape: model, fields, name and the stats it serves
+Suggestion = namedtuple('Suggestion', ['model', 'fields', 'name', 'serves'])
+
+SUGGESTED_INDEXES = [
+    Suggestion(CourseEnrollment, ['course', 'created'], 'stats_enroll_course_created',
+               "enrollments per course, and per course and day"),
+    Suggestion(CourseEnrollment, ['created'], 'stats_enroll_created', "new enrollments per year, month and day"),
+    Suggestion(UserProfile, ['country', 'user'], 'stats_profile_country_user', "users per country"),
+    Suggestion(User, ['date_joined'], 'stats_user_date_joined', "new users per year, month and day"),
+]
+
+SQLITE_PLAN_STEP = re.compile(
+    r'(?P<step>SCAN|SEARCH) (?:TABLE )?(?P<table>\S+)(?: AS \S+)?'
+    r'(?: USING (?P<covering>COVERING )?INDEX (?P<index>\S+))?'
+)
+
+
+def _postgresql_plan(rows):
+    plan = Plan(set(), [], set(), set())
+    nodes = rows[0][0]
+    nodes = [node['Plan'] for node in (json.loads(nodes) if isinstance(nodes, str) else nodes)]
+    while nodes:
+        node = nodes.pop()
+        node_type = node['Node Type']
+        if node_type == 'Seq Scan':
+            plan.full_scans.add(node['Relation Name'])
+        elif node_type in ('Index Scan', 'Index Only Scan', 'Bitmap Index Scan'):
+            plan.indexes.add(node['Index Name'])
+            if node_type == 'Index Only Scan':
+                plan.index_only.add(node['Index Name'])
+        elif node_type in ('Sort', 'Incremental Sort'):
+            plan.sorts.append(node_type)
+        nodes.extend(node.get('Plans', []))
+    return plan
+
+
+def _mysql_plan(rows):
+    plan = Plan(set(), [], set(), set())
+    nodes = [json.loads(rows[0][0])]
+    while nodes:
+        node = nodes.pop()
+        if isinstance(node, list):
+            nodes.extend(node)
+            continue
+        if not isinstance(node, dict):
+            continue
+        if 'table_name' in node:
+            if node.get('access_type') == 'ALL':
+                plan.full_scans.add(node['table_name'])
+            if node.get('key'):
+                plan.indexes.add(node['key'])
+                if node.get('using_index'):
+                    plan.index_only.add(node['key'])
+        # MySQL flags sorts with using_filesort/using_temporary_table, MariaDB with filesort/temporary_table nodes
+        for flag in ('using_filesort', 'using_temporary_table', 'filesort', 'temporary_table'):
+            if node.get(flag):
+                plan.sorts.append(flag)
+        nodes.extend(node.values())
+    return plan
+
+
+def _sqlite_plan(rows):
+    plan = Plan(set(), [], set(), set())
+    for *_, detail in rows:
+        if detail.startswith('USE TEMP B-TREE'):
+            plan.sorts.append(detail)
+            continue
+        if detail.startswith('SCAN CONSTANT ROW'):
+            continue
+        step = SQLITE_PLAN_STEP.match(detail)
+        if step is None:
+            continue
+        if step['index']:
+            plan.indexes.add(step['index'])
+            if step['covering']:
+                plan.index_only.add(step['index'])
+        elif step['step'] == 'SCAN':
+            plan.full_scans.add(step['table'])
+    return plan
+
+
+# EXPLAIN format and plan parser for each database vendor
+EXPLAIN_FORMATS = {
+    'postgresql': ('JSON', _postgresql_plan),
+    'mysql': ('JSON', _mysql_plan),
+    'sqlite': (None, _sqlite_plan),
+}
+
+
+def explain(sql, params, using):
+    """
+    Explain one query.
+
+    Returns:
+        Plan: What the query does, or None on an unsupported database vendor
+    """
+    connection = connections[using]
+    if connection.vendor not in EXPLAIN_FORMATS:
+        return None
+    explain_format, parse = EXPLAIN_FORMATS[connection.vendor]
+    with connection.cursor() as cursor:
+        cursor.execute(f'{connection.ops.explain_query_prefix(explain_format)} {sql}', params)
+        return parse(cursor.fetchall())
+
+
+class _Recorder:
+    """``execute_wrapper`` recording the SELECT queries it lets through."""
+
+    def __init__(self, using):
+        self.using = using
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        if not many and sql.lstrip()[:6].upper() == 'SELECT':
+            self.queries.append((sql, params, self.using))
+        return execute(sql, params, many, context)
+
+
+def get_read_sources():
+    """Get each read path of the stats, by name."""
+    sources = {
+        key_suffix: partial(function, sites.PLATFORM)
+        for key_suffix, function in views.STATS_FUNCTIONS.items()
+    }
+    shards = sites.get_shards()
+    if shards != [sites.PLATFORM]:
+        sources.update({
+            f'{key_suffix} (one site)': partial(function, shards[0])
+            for key_suffix, function in views.STATS_FUNCTIONS.items()
+        })
+    sources.update({
+        f'course page ({sort})': partial(views.get_course_page, sort)
+        for sort in views.COURSE_SORTS
+    })
+    if apps.is_installed('edx_stats.core'):
+        from .core import timeseries  # pylint: disable=import-outside-toplevel
+        sources.update({
+            f'series ({interval})': partial(timeseries.get_series, interval, 90)
+            for interval in timeseries.INTERVALS
+        })
+    return sources
+
+
+def get_aggregate_sources():
+    """Get the querysets of the full aggregates, which are explained without running them, by name."""
+    queries = {
+        f'rollup ({name})': queryset
+        for name, queryset in rollup.rollup_queries('year').items()
+    }
+    if apps.is_installed('edx_stats.core'):
+        from .core import materialize  # pylint: disable=import-outside-toplevel
+        queries.update({
+            f'top-N reconcile ({name})': queryset
+            for name, queryset in materialize.source_queries().items()
+        })
+    return queries
+
+
+def explain_all():
+    """
+    Run and explain the read path, and explain the full aggregates.
+
+    Returns:
+        tuple: The Explained queries, each under the first read path that
+            issues it, and the error of each read path that failed, such as a
+            timeout, by name
+    """
+    explained = []
+    errors = {}
+    seen = set()
+    for source, function in get_read_sources().items():
+        recorders = [_Recorder(using) for using in {DEFAULT_DB_ALIAS, app_settings.STATS_DATABASE}]
+        try:
+            with ExitStack() as stack:
+                stack.enter_context(compute.statement_timeout())
+                for recorder in recorders:
+                    stack.enter_context(connections[recorder.using].execute_wrapper(recorder))
+                function()
+        except DatabaseError as error:
+            errors[source] = str(error)
+        for recorder in recorders:
+            for sql, params, using in recorder.queries:
+                if sql not in seen:
+                    seen.add(sql)
+                    explained.append(Explained(source, using, sql, explain(sql, params, using)))
+
+    for source, queryset in get_aggregate_sources().items():
+        sql, params = queryset.query.sql_with_params()
+        explained.append(Explained(source, queryset.db, sql, explain(sql, params, queryset.db)))
+    return explained, errors
+
+
+def get_unused_indexes(explained):
+    """
+    Get the indexes of the summary tables that no explained query reads.
+
+    Unique indexes are left out, since the incremental updates look rows
+    up by them.
+
+    Returns:
+        list: ``(table, index name)`` pairs
+    """
+    if not apps.is_installed('edx_stats.core'):
+        return []
+    used = set().union(*(query.plan.indexes for query in explained if query.plan))
+    connection = connections[app_settings.STATS_DATABASE]
+    unused = []
+    with connection.cursor() as cursor:
+        for model in apps.get_app_config('core').get_models():
+            table = model._meta.db_table
+            for name, constraint in connection.introspection.get_constraints(cursor, table).items():
+                if constraint['index'] and not constraint['unique'] and not constraint['primary_key']:
+                    if name not in used:
+                        unused.append((table, name))
+    return unused
+
+
+def _has_index(connection, cursor, table, columns):
+    """Return True when an index of ``table`` starts with ``columns``."""
+    return any(
+        constraint['columns'][:len(columns)] == columns
+        for constraint in connection.introspection.get_constraints(cursor, table).values()
+        if constraint['index'] or constraint['unique'] or constraint['primary_key']
+    )
+
+
+def get_suggestions(explained, using=DEFAULT_DB_ALIAS):
+    """
+    Get the SUGGESTED_INDEXES on the source tables that some query scans in
+    full, and that no existing index already starts with.
+
+    Returns:
+        list: ``(Suggestion, SQL statements creating its index)`` pairs
+    """
+    scanned = set().union(*(query.plan.full_scans for query in explained if query.plan))
+    connection = connections[using]
+    suggestions = []
+    with connection.cursor() as cursor:
+        for suggestion in SUGGESTED_INDEXES:
+            opts = suggestion.model._meta
+            columns = [opts.get_field(field).column for field in suggestion.fields]
+            if opts.db_table not in scanned or _has_index(connection, cursor, opts.db_table, columns):
+                continue
+            with connection.schema_editor(collect_sql=True, atomic=False) as editor:
+                editor.add_index(suggestion.model, Index(fields=suggestion.fields, name=suggestion.name))
+            suggestions.append((suggestion, editor.collected_sql))
+    return suggestions
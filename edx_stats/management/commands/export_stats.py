@@ -0,0 +1,34 @@
+"""
+Stream a full stats listing to a file or stdout as CSV or NDJSON.
+"""
+from django.core.management.base import BaseCommand
+
+from edx_stats import exports
+from edx_stats.views import EXPORTS
+
+
+class Command(BaseCommand):
+    help = "Export every course, country or year of the stats, one row at a time."
+
+    def add_arguments(self, parser):
+        parser.add_argument('name', choices=sorted(EXPORTS), help="The listing to export.")
+        parser.add_argument(
+            '--format',
+            choices=sorted(exports.FORMATS),
+            default='csv',
+            help="Output format (default: csv).",
+        )
+        parser.add_argument(
+            '--output',
+            help="File to write to (default: stdout).",
+        )
+
+    def handle(self, *args, **options):
+        fields, rows = EXPORTS[options['name']]
+        lines = exports.export_lines(options['format'], fields, rows())
+        if not options['output']:
+            for line in lines:
+                self.stdout.write(line, ending='')
+            return
+        with open(options['output'], 'w', newline='', encoding='utf-8') as output:
+            output.writelines(lines)
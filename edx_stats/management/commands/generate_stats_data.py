@@ -0,0 +1,96 @@
+"""
+Fill the database with synthetic users, courses and enrollments for benchmarking the stats.
+"""
+from django.apps import apps
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+
+from edx_stats import synthetic
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate synthetic users, profiles, courses and enrollments at a given scale, "
+        "then rebuild the summary tables."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--enrollments',
+            type=int,
+            default=10000,
+            help="Number of enrollments (default: 10000).",
+        )
+        parser.add_argument(
+            '--users',
+            type=int,
+            help="Number of users (default: a quarter of --enrollments).",
+        )
+        parser.add_argument(
+            '--courses',
+            type=int,
+            help="Number of courses (default: one per 1000 enrollments, at least 10).",
+        )
+        parser.add_argument(
+            '--orgs',
+            type=int,
+            default=5,
+            help="Number of orgs the courses belong to (default: 5).",
+        )
+        parser.add_argument(
+            '--years',
+            type=int,
+            default=5,
+            help="Users join over this many years up to now (default: 5).",
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help="Users written per batch (default: 5000).",
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=0,
+            help="Random seed (default: 0).",
+        )
+        parser.add_argument(
+            '--clear',
+            action='store_true',
+            help="Delete previously generated data first.",
+        )
+        parser.add_argument(
+            '--skip-rebuild',
+            action='store_true',
+            help="Do not rebuild the core summary tables afterwards.",
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help="Run even when DEBUG is off.",
+        )
+
+    def handle(self, *args, **options):
+        if not (settings.DEBUG or options['force']):
+            raise CommandError("This writes synthetic data to the database; pass --force to run with DEBUG off.")
+        if options['clear']:
+            synthetic.clear()
+        try:
+            counts = synthetic.generate(
+                options['enrollments'],
+                users=options['users'],
+                courses=options['courses'],
+                orgs=options['orgs'],
+                years=options['years'],
+                batch_size=options['batch_size'],
+                seed=options['seed'],
+            )
+        except ValueError as error:
+            raise CommandError(str(error)) from error
+        self.stdout.write(self.style.SUCCESS(
+            "Generated {users} users, {courses} courses and {enrollments} enrollments.".format(**counts)
+        ))
+        if apps.is_installed('edx_stats.core') and not options['skip_rebuild']:
+            call_command('rebuild_stats', stdout=self.stdout)
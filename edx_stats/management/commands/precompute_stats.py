@@ -0,0 +1,49 @@
+"""
+Precompute every edx_stats stat into the cache, once or on an interval.
+"""
+import logging
+import time
+
+from django.core.management.base import BaseCommand
+
+from edx_stats import app_settings, precompute
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = "Recompute every stat for every site and store it in the cache, seeding the summary tables first."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help="Keep running, recomputing every --interval seconds.",
+        )
+        parser.add_argument(
+            '--interval',
+            type=int,
+            default=app_settings.STATS_REFRESH_INTERVAL,
+            help="Seconds between runs with --loop (default: STATS_REFRESH_INTERVAL).",
+        )
+        parser.add_argument(
+            '--skip-tables',
+            action='store_true',
+            help="Do not seed the core summary tables, bucket closed days or reconcile the top-N counters first.",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            started = time.monotonic()
+            try:
+                precompute.precompute_stats(update_tables=not options['skip_tables'])
+                self.stdout.write(self.style.SUCCESS(
+                    f"Stats precomputed in {time.monotonic() - started:.1f}s."
+                ))
+            except Exception:  # pylint: disable=broad-except
+                if not options['loop']:
+                    raise
+                logger.exception("Precomputing stats failed; retrying next interval")
+            if not options['loop']:
+                return
+            time.sleep(max(0, options['interval'] - (time.monotonic() - started)))
@@ -0,0 +1,66 @@
+"""
+Rebuild the edx_stats summary tables from the Open edX source tables.
+"""
+from django.core.management.base import BaseCommand
+
+from edx_stats import app_settings, cache, precompute
+from edx_stats.core import backfill, timeseries, topn
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the core summary tables (course, country, yearly, daily and user stats) "
+        "and the top-N counters, then precompute every stat. The source tables are counted in "
+        "throttled chunks, and an interrupted run resumes where it stopped."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=app_settings.STATS_REBUILD_CHUNK_SIZE,
+            help="Primary keys of a source table counted per query (default: STATS_REBUILD_CHUNK_SIZE).",
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=app_settings.STATS_REBUILD_BATCH_SIZE,
+            help="Summary table rows written per transaction (default: STATS_REBUILD_BATCH_SIZE).",
+        )
+        parser.add_argument(
+            '--sleep',
+            type=float,
+            default=app_settings.STATS_REBUILD_SLEEP,
+            help="Seconds to sleep after each chunk and batch (default: STATS_REBUILD_SLEEP).",
+        )
+        parser.add_argument(
+            '--restart',
+            action='store_true',
+            help="Discard the progress of an interrupted run and start over.",
+        )
+        parser.add_argument(
+            '--skip-precompute',
+            action='store_true',
+            help="Do not precompute the stats into the cache afterwards.",
+        )
+
+    def progress(self, source, position, last_id):
+        if self.verbosity >= 2:
+            self.stdout.write(f"  {source}: {position}/{last_id}")
+
+    def handle(self, *args, **options):
+        self.verbosity = options['verbosity']
+        rows = backfill.backfill(
+            chunk_size=options['chunk_size'],
+            batch_size=options['batch_size'],
+            sleep=options['sleep'],
+            restart=options['restart'],
+            progress=self.progress,
+        )
+        self.stdout.write(", ".join(f"{count} {model} rows" for model, count in rows.items()))
+        timeseries.rebuild()
+        topn.reconcile(summary=True)
+        cache.invalidate_stats_cache()
+        if not options['skip_precompute']:
+            precompute.precompute_stats(update_tables=False)
+        self.stdout.write(self.style.SUCCESS("Summary tables rebuilt."))
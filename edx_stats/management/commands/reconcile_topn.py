@@ -0,0 +1,32 @@
+"""
+Correct the top-N course and country counters from the source tables.
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from edx_stats.core import topn
+
+
+class Command(BaseCommand):
+    help = (
+        "Replace the top-N course and country counters in Redis with the true counts from the "
+        "source tables, and report how many were wrong."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--from-summary',
+            action='store_true',
+            help="Read the counts from the core summary tables instead of aggregating the source tables.",
+        )
+
+    def handle(self, *args, **options):
+        drift = topn.reconcile(summary=options['from_summary'])
+        if drift is None:
+            raise CommandError(
+                "The top-N counters are only kept when the default cache is django-redis "
+                "and STATS_TOPN_COUNTERS is on."
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f"Top-N counters reconciled: {drift['courses']} course and {drift['countries']} "
+            f"country counts corrected."
+        ))
@@ -0,0 +1,65 @@
+"""
+Explain every query of the stats and report missing or unused indexes.
+"""
+from django.core.management.base import BaseCommand
+
+from edx_stats import indexes
+
+
+class Command(BaseCommand):
+    help = (
+        "Run EXPLAIN on every stats query, report full scans, sorts and unused summary table "
+        "indexes, and print SQL for indexes on the source tables that would serve them."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sql',
+            action='store_true',
+            help="Only print the SQL of the suggested indexes.",
+        )
+
+    def handle(self, *args, **options):
+        explained, errors = indexes.explain_all()
+        suggestions = indexes.get_suggestions(explained)
+        if options['sql']:
+            for _, statements in suggestions:
+                for statement in statements:
+                    self.stdout.write(statement)
+            return
+
+        for query in explained:
+            self.stdout.write(self.style.MIGRATE_HEADING(f'{query.source} [{query.using}]'))
+            self.stdout.write(f'  {query.sql}')
+            plan = query.plan
+            if plan is None:
+                self.stdout.write('  (EXPLAIN is not supported on this database)')
+                continue
+            if plan.full_scans:
+                self.stdout.write(self.style.WARNING(f"  full scan: {', '.join(sorted(plan.full_scans))}"))
+            if plan.sorts:
+                self.stdout.write(self.style.WARNING(f"  sorts: {len(plan.sorts)}"))
+            for index in sorted(plan.indexes):
+                self.stdout.write(f"  index: {index}{' (index only)' if index in plan.index_only else ''}")
+        for source, error in errors.items():
+            self.stdout.write(self.style.ERROR(f'{source} failed: {error}'))
+
+        unused = indexes.get_unused_indexes(explained)
+        self.stdout.write(self.style.MIGRATE_HEADING('Summary table indexes no stats query reads'))
+        for table, name in unused:
+            self.stdout.write(f'  {table}: {name}')
+        if not unused:
+            self.stdout.write('  none')
+
+        self.stdout.write(self.style.MIGRATE_HEADING('Suggested indexes on the source tables'))
+        for suggestion, statements in suggestions:
+            self.stdout.write(f'  -- {suggestion.serves}')
+            for statement in statements:
+                self.stdout.write(f'  {statement}')
+        if suggestions:
+            self.stdout.write(
+                "  Review these before applying them, e.g. with CREATE INDEX CONCURRENTLY on PostgreSQL; "
+                "they alter Open edX tables."
+            )
+        else:
+            self.stdout.write('  none')
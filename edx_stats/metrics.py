@@ -0,0 +1,171 @@
+"""
+Per-stat metrics of the cache and compute hot path.
+
+With STATS_METRICS_ENABLED, every stat read counts as a ``hit`` (a fresh
+value), ``stale`` (an expired value served while it is recomputed) or
+``miss`` (computed, or waited for, by this request), and every compute
+records its duration and number of queries, and every write the size of
+the cached payload. When disabled, each instrumented call only checks the
+setting.
+
+Each worker adds up its counts in memory and adds them to the totals in the
+shared cache with ``cache.incr`` at most every STATS_METRICS_FLUSH_INTERVAL
+seconds, so the endpoints report every worker, a few seconds late, without
+an extra round trip per read.
+"""
+import hmac
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import ExitStack, contextmanager
+
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from . import app_settings
+
+# Kept apart from STATS_CACHE_KEY_PREFIX, so invalidating the stats does not reset the counters
+METRICS_CACHE_KEY_PREFIX = 'edx_stats_metrics:'
+
+# Counters recorded for each stat, with their Prometheus name, labels and help text
+COUNTERS = {
+    'hits': ('edx_stats_cache_reads_total', 'result="hit"', "Stat reads, by result."),
+    'stale': ('edx_stats_cache_reads_total', 'result="stale"', "Stat reads, by result."),
+    'misses': ('edx_stats_cache_reads_total', 'result="miss"', "Stat reads, by result."),
+    'unavailable': ('edx_stats_unavailable_total', '', "Stat reads with no value to serve."),
+    'computes': ('edx_stats_computes_total', '', "Stat computations."),
+    'compute_microseconds': ('edx_stats_compute_microseconds_total', '', "Time spent computing stats."),
+    'queries': ('edx_stats_compute_queries_total', '', "Queries run computing stats."),
+    'writes': ('edx_stats_cache_writes_total', '', "Stat values written to the cache."),
+    'payload_bytes': ('edx_stats_cache_payload_bytes_total', '', "Bytes of stat values written to the cache."),
+}
+
+_lock = threading.Lock()
+_pending = defaultdict(Counter)
+_last_flush = time.monotonic()
+
+
+def enabled():
+    """Return True when metrics are recorded and served."""
+    return app_settings.STATS_METRICS_ENABLED
+
+
+def stat_name(cache_key):
+    """Get the stat a cache key holds, e.g. 'total_stats'."""
+    return cache_key.rsplit(':', 1)[-1]
+
+
+def _metric_key(stat, counter):
+    return f'{METRICS_CACHE_KEY_PREFIX}{stat}:{counter}'
+
+
+def increment(stat, **counts):
+    """Add ``counts`` (by COUNTERS name) to the counters of ``stat``."""
+    if not app_settings.STATS_METRICS_ENABLED:
+        return
+    with _lock:
+        _pending[stat].update(counts)
+        due = time.monotonic() - _last_flush >= app_settings.STATS_METRICS_FLUSH_INTERVAL
+    if due:
+        flush()
+
+
+def flush():
+    """Add this worker's counts to the totals in the shared cache."""
+    global _last_flush  # pylint: disable=global-statement
+    with _lock:
+        pending = dict(_pending)
+        _pending.clear()
+        _last_flush = time.monotonic()
+    for stat, counts in pending.items():
+        for counter, value in counts.items():
+            if not value:
+                continue
+            key = _metric_key(stat, counter)
+            try:
+                cache.incr(key, value)
+            except ValueError:
+                # The first count of this counter; another worker may add it first
+                if not cache.add(key, value, None):
+                    cache.incr(key, value)
+
+
+class _QueryCounter:
+    """``execute_wrapper`` counting the queries it lets through."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+@contextmanager
+def measure(stat):
+    """Record the duration and number of queries of computing ``stat``."""
+    if not app_settings.STATS_METRICS_ENABLED:
+        yield
+        return
+    counter = _QueryCounter()
+    started = time.perf_counter()
+    with ExitStack() as stack:
+        for alias in {DEFAULT_DB_ALIAS, app_settings.STATS_DATABASE}:
+            stack.enter_context(connections[alias].execute_wrapper(counter))
+        yield
+    increment(
+        stat,
+        computes=1,
+        compute_microseconds=int((time.perf_counter() - started) * 1000000),
+        queries=counter.count,
+    )
+
+
+def get_metrics(stats):
+    """
+    Get the totals of every counter of every stat, after flushing this
+    worker's counts.
+
+    Args:
+        stats (iterable): The stat names
+
+    Returns:
+        dict: By stat name, every counter plus ``hit_ratio``,
+            ``mean_compute_ms``, ``mean_queries`` and ``mean_payload_bytes``,
+            each None until there is something to average
+    """
+    flush()
+    stats = list(stats)
+    values = cache.get_many([_metric_key(stat, counter) for stat in stats for counter in COUNTERS])
+    metrics = {}
+    for stat in stats:
+        counts = {counter: values.get(_metric_key(stat, counter), 0) for counter in COUNTERS}
+        reads = counts['hits'] + counts['stale'] + counts['misses']
+        computes, writes = counts['computes'], counts['writes']
+        metrics[stat] = {
+            **counts,
+            'hit_ratio': counts['hits'] / reads if reads else None,
+            'mean_compute_ms': counts['compute_microseconds'] / computes / 1000 if computes else None,
+            'mean_queries': counts['queries'] / computes if computes else None,
+            'mean_payload_bytes': counts['payload_bytes'] / writes if writes else None,
+        }
+    return metrics
+
+
+def prometheus_text(stats):
+    """Get the counters of every stat in the Prometheus text exposition format."""
+    metrics = get_metrics(stats)
+    lines = []
+    for counter, (name, labels, help_text) in COUNTERS.items():
+        if f'# TYPE {name} counter' not in lines:
+            lines += [f'# HELP {name} {help_text}', f'# TYPE {name} counter']
+        for stat, counts in metrics.items():
+            lines.append(f'{name}{{stat="{stat}"{"," + labels if labels else ""}}} {counts[counter]}')
+    return '\n'.join(lines) + '\n'
+
+
+def has_token(request):
+    """Return True when the request carries STATS_METRICS_TOKEN as a bearer token."""
+    token = app_settings.STATS_METRICS_TOKEN
+    authorization = request.headers.get('Authorization', '')
+    return bool(token) and hmac.compare_digest(authorization, f'Bearer {token}')
@@ -0,0 +1,138 @@
+"""
+Keyset pagination helpers for the stats lists.
+
+A page is requested with the sort values of the last row already shown (the
+cursor), so fetching any page is an index range scan instead of an
+``OFFSET`` that reads and discards every earlier row. The same ordering can
+be applied to a queryset or to a list of rows already in memory.
+"""
+import base64
+import json
+
+from django.db.models import Q
+
+
+def encode_cursor(values):
+    """Encode the sort values of a row as an opaque URL-safe cursor."""
+    return base64.urlsafe_b64encode(json.dumps(list(values)).encode()).decode()
+
+
+def decode_cursor(cursor, order_by):
+    """
+    Decode a cursor made by :func:`encode_cursor` for the ``order_by`` sort.
+
+    A cursor from another sort, or one that was tampered with, is treated as
+    no cursor rather than being compared against rows it cannot be ordered
+    with.
+
+    Returns:
+        list: The sort values, or None for a missing or malformed cursor
+    """
+    if not cursor:
+        return None
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except ValueError:
+        return None
+    if not isinstance(values, list) or len(values) != len(order_by):
+        return None
+    for field, value in zip(order_by, values):
+        expected = (int, float) if field.startswith('-') else str
+        if isinstance(value, bool) or not isinstance(value, expected):
+            return None
+    return values
+
+
+def keyset_filter(order_by, values):
+    """
+    Build the filter selecting the rows that sort after ``values``.
+
+    Args:
+        order_by (tuple): Field names, prefixed with '-' when descending; the
+            last one must be unique
+        values (list): The value of each field in the last row shown
+
+    Returns:
+        Q: ``(f1 > v1) OR (f1 = v1 AND f2 > v2) OR ...``, with '<' for
+            descending fields
+    """
+    condition = Q()
+    equal = {}
+    for field, value in zip(order_by, values):
+        name = field.lstrip('-')
+        lookup = 'lt' if field.startswith('-') else 'gt'
+        condition |= Q(**equal, **{f'{name}__{lookup}': value})
+        equal[name] = value
+    return condition
+
+
+def sort_key(order_by, values):
+    """
+    Get a key that orders row values like ``order_by`` does in the database.
+
+    Descending fields must be numeric and ascending ones text.
+    """
+    return tuple(
+        -value if field.startswith('-') else value
+        for field, value in zip(order_by, values)
+    )
+
+
+def iter_keyset(queryset, order_by, fields, chunk_size):
+    """
+    Iterate over every row of ``queryset``, reading ``chunk_size`` rows per
+    query.
+
+    Unlike ``QuerySet.iterator()``, which reads the whole result into memory
+    on MySQL, each query is a bounded keyset range, so memory use stays flat
+    on every database.
+
+    Args:
+        queryset (QuerySet): The rows to read
+        order_by (tuple): Sort fields, as for :func:`keyset_filter`
+        fields (tuple): The fields of each row tuple; must include every
+            sort field
+        chunk_size (int): Rows read per query
+
+    Yields:
+        tuple: The ``fields`` values of each row, in ``order_by`` order
+    """
+    columns = [fields.index(field.lstrip('-')) for field in order_by]
+    rows = queryset.order_by(*order_by).values_list(*fields)
+    page = rows
+    while True:
+        chunk = list(page[:chunk_size])
+        yield from chunk
+        if len(chunk) < chunk_size:
+            return
+        page = rows.filter(keyset_filter(order_by, [chunk[-1][column] for column in columns]))
+
+
+def paginate_rows(rows, order_by, fields, cursor=None, page_size=50):
+    """
+    Get the page of in-memory rows following ``cursor``.
+
+    Args:
+        rows (iterable): Row tuples, in any order
+        order_by (tuple): Sort fields, as for :func:`keyset_filter`
+        fields (tuple): The field name of each row tuple column
+        cursor (str): Cursor of the last row shown, None for the first page
+        page_size (int): Maximum number of rows per page
+
+    Returns:
+        tuple: The page rows and the cursor of the next page (None on the last)
+    """
+    columns = [fields.index(field.lstrip('-')) for field in order_by]
+
+    def row_key(row):
+        return sort_key(order_by, [row[column] for column in columns])
+
+    rows = sorted(rows, key=row_key)
+    after = decode_cursor(cursor, order_by)
+    if after is not None:
+        after_key = sort_key(order_by, after)
+        rows = [row for row in rows if row_key(row) > after_key]
+    page = rows[:page_size]
+    if len(rows) <= page_size:
+        return page, None
+    return page, encode_cursor([page[-1][column] for column in columns])
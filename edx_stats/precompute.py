@@ -0,0 +1,61 @@
+"""
+Background precomputation of every cached stat for every site.
+
+Run it every STATS_REFRESH_INTERVAL seconds, either with the
+``precompute_stats`` management command (``--loop`` keeps it running) or as
+the ``edx_stats.precompute_stats`` Celery task, so that dashboard requests
+only ever read the cache.
+"""
+import logging
+
+from django.apps import apps
+
+from . import app_settings, cache, sites, views
+
+logger = logging.getLogger(__name__)
+
+
+def get_scopes():
+    """
+    Get the scope of every site: each shard, then the whole platform, which
+    is partly combined from the shards.
+    """
+    scopes = sites.get_shards()
+    if sites.PLATFORM not in scopes:
+        scopes.append(sites.PLATFORM)
+    return scopes
+
+
+def precompute_stats(update_tables=True):
+    """
+    Recompute every stat and write it to the cache of every site scope.
+
+    When the ``core`` summary tables are installed, they are seeded first
+    if they are not yet, with the same chunked, throttled backfill as
+    ``rebuild_stats``; once seeded, the signal deltas keep them current and
+    they are not rebuilt again. Any queued user and yearly deltas are
+    flushed, and the days closed since the last run are then bucketed.
+
+    The top-N counters are reconciled from the source tables, like
+    ``reconcile_topn`` does, so drift in the summary tables is not copied
+    into them; only right after seeding, when the summary tables hold the
+    true counts, are they read instead.
+    """
+    if update_tables and apps.is_installed('edx_stats.core'):
+        from .core import backfill, materialize, timeseries, topn
+        seeded = not materialize.is_materialized()
+        if seeded:
+            backfill.backfill()
+        materialize.flush_deltas()
+        timeseries.update_buckets()
+        topn.reconcile(summary=seeded)
+
+    # Values stay fresh until well past the next run, so requests never
+    # find them expired between two runs.
+    timeout = max(cache.STATS_CACHE_TIMEOUT, 2 * app_settings.STATS_REFRESH_INTERVAL)
+    for scope in get_scopes():
+        logger.info("Precomputing stats for %s", sites.scope_key(scope))
+        for key_suffix in views.STATS_FUNCTIONS:
+            cache.set_cached_stats(
+                cache.get_cache_key(key_suffix, scope), views.compute_stats(key_suffix, scope), timeout
+            )
@@ -0,0 +1,95 @@
+"""
+Freshness of the database the statistics are read from.
+
+When STATS_DATABASE points at a read replica, the dashboards report how far
+behind the primary it is, as reported by the replica itself: the age of the
+last replayed transaction on PostgreSQL (0 once everything received has been
+replayed), and ``Seconds_Behind_Source`` on MySQL and MariaDB. Other
+databases report no lag. The lag is cached for
+STATS_REPLICA_LAG_CACHE_TIMEOUT seconds, so dashboards do not query the
+replica's status on every request.
+"""
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from . import app_settings
+
+REPLICA_LAG_CACHE_KEY = 'edx_stats:replica_lag'
+
+POSTGRESQL_LAG_QUERY = """
+    SELECT CASE
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+    END
+"""
+
+
+def _postgresql_lag(cursor):
+    """Get the lag of a PostgreSQL standby, None if it is not one."""
+    cursor.execute(POSTGRESQL_LAG_QUERY)
+    lag = cursor.fetchone()[0]
+    return None if lag is None else float(lag)
+
+
+def _mysql_lag(cursor, connection):
+    """Get the lag of a MySQL or MariaDB replica, None if it is not one or is not replicating."""
+    replica_status = (10, 5, 1) if connection.mysql_is_mariadb else (8, 0, 22)
+    cursor.execute('SHOW REPLICA STATUS' if connection.mysql_version >= replica_status else 'SHOW SLAVE STATUS')
+    row = cursor.fetchone()
+    if row is None:
+        return None
+    status = dict(zip([column[0] for column in cursor.description], row))
+    lag = status.get('Seconds_Behind_Source', status.get('Seconds_Behind_Master'))
+    return None if lag is None else float(lag)
+
+
+def measure_replica_lag():
+    """
+    Ask the stats database how many seconds it is behind the primary.
+
+    Returns:
+        float: The lag, or None when the statistics are read from the
+            primary or the database does not report one
+    """
+    if app_settings.STATS_DATABASE == DEFAULT_DB_ALIAS:
+        return None
+    connection = connections[app_settings.STATS_DATABASE]
+    if connection.vendor not in ('postgresql', 'mysql'):
+        return None
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            return _postgresql_lag(cursor)
+        return _mysql_lag(cursor, connection)
+
+
+def get_replica_lag():
+    """
+    Get how many seconds the stats database is behind the primary, as
+    measured at most STATS_REPLICA_LAG_CACHE_TIMEOUT seconds ago.
+
+    Returns:
+        float: See :func:`measure_replica_lag`
+    """
+    if app_settings.STATS_DATABASE == DEFAULT_DB_ALIAS:
+        return None
+    cached = cache.get(REPLICA_LAG_CACHE_KEY)
+    if cached is not None:
+        return cached[0]
+    lag = measure_replica_lag()
+    cache.set(REPLICA_LAG_CACHE_KEY, (lag,), app_settings.STATS_REPLICA_LAG_CACHE_TIMEOUT)
+    return lag
+
+
+def get_freshness():
+    """
+    Get the dashboard context describing the stats database's freshness.
+
+    Returns:
+        dict: ``replica_lag`` (see :func:`get_replica_lag`) and
+            ``replica_lagging``, True above STATS_REPLICA_LAG_WARNING
+    """
+    lag = get_replica_lag()
+    return {
+        'replica_lag': lag,
+        'replica_lagging': lag is not None and lag > app_settings.STATS_REPLICA_LAG_WARNING,
+    }
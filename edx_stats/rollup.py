@@ -0,0 +1,121 @@
+"""
+Per-period rollup of new users and new enrollments, shared by both
+dashboards and by the summary table rebuild.
+
+Each table is scanned once, grouped by the truncated join or enrollment
+date. Periods that have closed never change, so :func:`get_rollup` caches
+them without expiry and only recounts the current period, through an
+indexable range filter on the date column.
+
+A site scope (see :mod:`edx_stats.sites`) restricts the rollup to the
+enrollments in its courses and the users with one of them.
+"""
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db.models import Count
+from django.db.models.functions import TruncMonth, TruncYear
+from django.utils import timezone
+from common.djangoapps.student.models import CourseEnrollment
+
+from . import app_settings, sites
+from .cache import STATS_CACHE_KEY_PREFIX
+
+User = get_user_model()
+
+ROLLUP_CACHE_KEY_PREFIX = f'{STATS_CACHE_KEY_PREFIX}rollup:'
+
+# Truncation function for each supported period
+PERIODS = {
+    'year': TruncYear,
+    'month': TruncMonth,
+}
+
+
+def period_start(period, now=None):
+    """
+    Get the start of the period containing ``now`` (default: the current time).
+    """
+    start = timezone.localtime(now).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    return start.replace(month=1) if period == 'year' else start
+
+
+def _row(period, start):
+    """Get an empty rollup row for the period beginning at ``start``."""
+    row = {'year': start.year}
+    if period == 'month':
+        row['month'] = start.month
+    row.update({'new_users': 0, 'new_enrollments': 0})
+    return row
+
+
+def rollup_queries(period='year', start=None, end=None, using=None, scope=sites.PLATFORM):
+    """
+    Get the grouped queries counting new users and new enrollments per
+    period; the arguments are those of :func:`compute_rollup`.
+
+    Returns:
+        dict: ``(period start, count)`` rows of each count, by name
+    """
+    trunc = PERIODS[period]
+    using = using or app_settings.STATS_DATABASE
+    enrollments = CourseEnrollment.objects.using(using)
+    users = User.objects.using(using)
+    if scope != sites.PLATFORM:
+        enrollments = enrollments.filter(sites.course_filter(scope, 'course__'))
+        users = users.filter(id__in=enrollments.values('user_id'))
+    queries = {}
+    for name, queryset, field in (
+        ('new_users', users, 'date_joined'),
+        ('new_enrollments', enrollments, 'created'),
+    ):
+        if start is not None:
+            queryset = queryset.filter(**{f'{field}__gte': start})
+        if end is not None:
+            queryset = queryset.filter(**{f'{field}__lt': end})
+        queries[name] = queryset.annotate(
+            period=trunc(field)
+        ).values_list('period').annotate(count=Count('id')).order_by()
+    return queries
+
+
+def compute_rollup(period='year', start=None, end=None, using=None, scope=sites.PLATFORM):
+    """
+    Count new users and new enrollments per period, with one grouped query
+    per table.
+
+    Args:
+        period (str): 'year' or 'month'
+        start (datetime): Only count rows created at or after this time
+        end (datetime): Only count rows created before this time
+        using (str): Database alias to count on, default STATS_DATABASE
+        scope (sites.Scope): The site courses to count, default all
+
+    Returns:
+        list: One dict per period with ``year`` (and ``month``), ``new_users``
+            and ``new_enrollments``, oldest first
+    """
+    rows = {}
+    for name, counts in rollup_queries(period, start, end, using, scope).items():
+        for period_start_value, count in counts:
+            if period_start_value is None:
+                continue
+            key = (period_start_value.year, period_start_value.month if period == 'month' else 1)
+            rows.setdefault(key, _row(period, period_start_value))[name] = count
+    return [rows[key] for key in sorted(rows)]
+
+
+def get_rollup(period='year', scope=sites.PLATFORM):
+    """
+    Get the rollup for every period, recounting only the current one.
+
+    The closed periods are cached without expiry under a key naming the
+    current period and the scope, so they are computed once per period
+    rollover.
+    """
+    boundary = period_start(period)
+    closed_key = f'{ROLLUP_CACHE_KEY_PREFIX}{period}:{sites.scope_key(scope)}:closed:{boundary:%Y-%m}'
+    closed = cache.get(closed_key)
+    if closed is None:
+        closed = compute_rollup(period, end=boundary, scope=scope)
+        cache.set(closed_key, closed, None)
+    return closed + compute_rollup(period, start=boundary, scope=scope)
@@ -0,0 +1,107 @@
+"""
+Compact encoding of stat results for the cache.
+
+Results are stored as JSON with a schema version instead of pickles. Lists
+of rows that share the same fields (dicts with the same keys, or tuples of
+the same length) are stored column by column, so each field name is written
+once rather than once per row. Payloads larger than
+STATS_CACHE_COMPRESS_THRESHOLD bytes are zlib-compressed.
+
+Decoding is lazy: :func:`decode` returns a :class:`ColumnRows` sequence that
+only builds the rows that are actually read.
+"""
+import json
+import zlib
+from collections.abc import Sequence
+
+from django.conf import settings
+
+# Bumped whenever the encoding changes; payloads of other versions are treated as cache misses
+SCHEMA_VERSION = 1
+
+# Payloads larger than this (in bytes) are compressed
+STATS_CACHE_COMPRESS_THRESHOLD = getattr(settings, 'STATS_CACHE_COMPRESS_THRESHOLD', 4096)
+
+JSON_MARKER = b'j'
+ZLIB_MARKER = b'z'
+
+
+class SchemaMismatch(ValueError):
+    """The payload was written with another schema version."""
+
+
+class ColumnRows(Sequence):
+    """
+    Read-only list of rows stored as columns, built one row at a time.
+    """
+
+    def __init__(self, columns, fields=None):
+        self._columns = columns
+        self._fields = fields
+        self._length = len(columns[0]) if columns else 0
+
+    def __len__(self):
+        return self._length
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self._length))]
+        values = tuple(column[index] for column in self._columns)
+        return dict(zip(self._fields, values)) if self._fields else values
+
+    def __repr__(self):
+        return f'ColumnRows({list(self)!r})'
+
+
+def _columns(rows):
+    """
+    Get the layout and columns of a list of uniform rows, or None if the rows
+    are not uniform.
+    """
+    first = rows[0]
+    if isinstance(first, dict):
+        fields = list(first)
+        if all(isinstance(row, dict) and list(row) == fields for row in rows):
+            return {'fields': fields, 'columns': [[row[field] for row in rows] for field in fields]}
+    elif isinstance(first, tuple):
+        width = len(first)
+        if all(isinstance(row, tuple) and len(row) == width for row in rows):
+            return {'columns': [list(column) for column in zip(*rows)]}
+    return None
+
+
+def encode(data):
+    """
+    Encode a stat result as bytes.
+
+    Values that JSON cannot represent, such as course keys, are stored as
+    strings.
+    """
+    payload = {'v': SCHEMA_VERSION}
+    layout = _columns(data) if isinstance(data, list) and data else None
+    if layout is not None:
+        payload.update(layout)
+    else:
+        payload['data'] = data
+    encoded = json.dumps(payload, separators=(',', ':'), default=str).encode()
+    if len(encoded) > STATS_CACHE_COMPRESS_THRESHOLD:
+        return ZLIB_MARKER + zlib.compress(encoded)
+    return JSON_MARKER + encoded
+
+
+def decode(encoded):
+    """
+    Decode bytes made by :func:`encode`.
+
+    Raises:
+        SchemaMismatch: If the payload was written with another schema version
+    """
+    marker, body = encoded[:1], encoded[1:]
+    if marker == ZLIB_MARKER:
+        body = zlib.decompress(body)
+    payload = json.loads(body)
+    if payload.get('v') != SCHEMA_VERSION:
+        raise SchemaMismatch(payload.get('v'))
+    if 'columns' in payload:
+        return ColumnRows(payload['columns'], payload.get('fields'))
+    return payload['data']
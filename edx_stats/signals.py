@@ -1,7 +1,17 @@
 """
 Signal handlers for edx_stats.
+
+Each handler only schedules invalidation of the stats its model actually
+feeds (see ``cache.STATS_DEPENDENCIES``), and only for changes that can move
+those numbers: a login saving ``last_login`` touches no stats at all, and a
+profile only counts when its stored country changes, or when a profile with
+a country is deleted. It is scheduled once the surrounding transaction
+commits, so a rolled back change schedules nothing.
 """
-from django.db.models.signals import post_save, post_delete
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, pre_save
 from django.dispatch import receiver
 from django.contrib.auth.models import User
 from openedx.core.djangoapps.content.course_overviews.models import CourseOverview
@@ -12,19 +22,44 @@ from . import cache
 @receiver([post_save, post_delete], sender=CourseOverview)
 def invalidate_course_stats(sender, **kwargs):
     """Invalidate course stats cache when a course is updated."""
-    cache.invalidate_stats_cache()
+    transaction.on_commit(partial(cache.schedule_invalidation, 'CourseOverview'))
 
 @receiver([post_save, post_delete], sender=CourseEnrollment)
-def invalidate_enrollment_stats(sender, **kwargs):
-    """Invalidate enrollment stats cache when enrollments change."""
-    cache.invalidate_stats_cache()
+def invalidate_enrollment_stats(sender, created=True, **kwargs):
+    """Invalidate enrollment stats cache when enrollments are added or removed."""
+    if created:
+        transaction.on_commit(partial(cache.schedule_invalidation, 'CourseEnrollment'))
 
 @receiver([post_save, post_delete], sender=User)
-def invalidate_user_stats(sender, **kwargs):
-    """Invalidate user stats cache when users are updated."""
-    cache.invalidate_stats_cache()
-
-@receiver([post_save, post_delete], sender=UserProfile)
-def invalidate_profile_stats(sender, **kwargs):
-    """Invalidate profile stats cache when user profiles are updated."""
-    cache.invalidate_stats_cache()
\ No newline at end of file
+def invalidate_user_stats(sender, created=True, **kwargs):
+    """Invalidate user stats cache when users are added or removed."""
+    if created:
+        transaction.on_commit(partial(cache.schedule_invalidation, 'User'))
+
+@receiver(pre_save, sender=UserProfile)
+def remember_profile_country(sender, instance, update_fields=None, **kwargs):
+    """
+    Stash the stored country as ``_edx_stats_old_country``, so the post_save
+    handlers, here and in ``core``, can tell whether it changed.
+    """
+    if update_fields is not None and 'country' not in update_fields:
+        # The country is not written, so it stays whatever is stored
+        instance._edx_stats_old_country = instance.country or ''
+    elif instance.pk:
+        instance._edx_stats_old_country = UserProfile.objects.filter(
+            pk=instance.pk
+        ).values_list('country', flat=True).first() or ''
+    else:
+        instance._edx_stats_old_country = ''
+
+@receiver(post_save, sender=UserProfile)
+def invalidate_profile_stats(sender, instance, **kwargs):
+    """Invalidate profile stats cache when a profile's country changed."""
+    if str(getattr(instance, '_edx_stats_old_country', '')) != str(instance.country or ''):
+        transaction.on_commit(partial(cache.schedule_invalidation, 'UserProfile'))
+
+@receiver(post_delete, sender=UserProfile)
+def invalidate_deleted_profile_stats(sender, instance, **kwargs):
+    """Invalidate profile stats cache when a profile with a country is deleted."""
+    if instance.country:
+        transaction.on_commit(partial(cache.schedule_invalidation, 'UserProfile'))
@@ -0,0 +1,167 @@
+"""
+Synthetic Open edX data for benchmarking the stats at scale.
+
+Generates users with profiles, courses spread over a few orgs, and their
+enrollments, written with ``bulk_create`` one batch of users at a time, so
+memory use stays flat from 10k to 10M enrollments. Users join at a steady
+rate over the last few years, enrollments per course follow a Zipf-like
+curve and countries a skewed one, roughly like a real platform.
+
+Every generated row can be told apart by USERNAME_PREFIX or ORG_PREFIX, so
+:func:`clear` removes them again. ``bulk_create`` sends no signals: rebuild
+the summary tables afterwards (``rebuild_stats``).
+"""
+import itertools
+import random
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import UNUSABLE_PASSWORD_PREFIX
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import Q
+from django.utils import timezone
+from opaque_keys.edx.keys import CourseKey
+from openedx.core.djangoapps.content.course_overviews.models import CourseOverview
+from common.djangoapps.student.models import CourseEnrollment, UserProfile
+
+User = get_user_model()
+
+USERNAME_PREFIX = 'stats-synthetic-'
+ORG_PREFIX = 'StatsSynthetic'
+
+# Country codes and their relative share of users; the rest have no country
+COUNTRY_WEIGHTS = {
+    'US': 30, 'IN': 20, 'CN': 8, 'BR': 6, 'GB': 5, 'MX': 4, 'DE': 3, 'FR': 3, 'CA': 3, 'ES': 2,
+    'NG': 2, 'EG': 2, 'PK': 2, 'ID': 2, 'JP': 1, 'AU': 1, 'CO': 1, 'RU': 1, 'TR': 1, 'PH': 1,
+    '': 10,
+}
+
+# Share of enrollments that have been unenrolled
+INACTIVE_RATE = 0.05
+
+
+@contextmanager
+def _explicit_timestamps(model, field_name):
+    """Let ``bulk_create`` store the given value of an ``auto_now_add`` field."""
+    field = model._meta.get_field(field_name)
+    auto_now_add = field.auto_now_add
+    field.auto_now_add = False
+    try:
+        yield
+    finally:
+        field.auto_now_add = auto_now_add
+
+
+def _create_courses(count, orgs, rng, start, using):
+    """Create ``count`` courses over ``orgs`` orgs, and return their keys."""
+    courses = []
+    for index in range(count):
+        org = f'{ORG_PREFIX}{index % orgs}'
+        course_key = CourseKey.from_string(f'course-v1:{org}+C{index}+{start.year}')
+        courses.append(CourseOverview(
+            id=course_key,
+            _location=course_key.make_usage_key('course', 'course'),
+            version=CourseOverview.VERSION,
+            org=org,
+            display_name=f'Synthetic Course {index}',
+            display_number_with_default=course_key.course,
+            display_org_with_default=org,
+            start=start + (timezone.now() - start) * rng.random(),
+        ))
+    CourseOverview.objects.using(using).bulk_create(courses, batch_size=1000)
+    return [course.id for course in courses]
+
+
+def _pick_courses(course_keys, cum_weights, count, rng):
+    """Pick ``count`` distinct courses, favouring the first ones."""
+    if count > len(course_keys) // 2:
+        return rng.sample(course_keys, count)
+    picked = set(rng.choices(course_keys, cum_weights=cum_weights, k=count))
+    while len(picked) < count:
+        picked.add(rng.choices(course_keys, cum_weights=cum_weights)[0])
+    return picked
+
+
+def generate(enrollments, users=None, courses=None, orgs=5, years=5, batch_size=5000, seed=0,
+             using=DEFAULT_DB_ALIAS):
+    """
+    Generate synthetic users, profiles, courses and enrollments.
+
+    Args:
+        enrollments (int): Number of enrollments
+        users (int): Number of users, default a quarter of ``enrollments``
+        courses (int): Number of courses, default one per 1000 enrollments,
+            at least 10
+        orgs (int): Number of orgs the courses belong to
+        years (int): Users join over this many years up to now
+        batch_size (int): Users written per batch
+        seed (int): Random seed; the same arguments always generate the same data
+        using (str): Database alias to write to
+
+    Returns:
+        dict: Number of ``users``, ``courses`` and ``enrollments`` created
+
+    Raises:
+        ValueError: If there are more enrollments per user than courses
+    """
+    users = users or max(1, enrollments // 4)
+    courses = courses or max(10, enrollments // 1000)
+    if -(-enrollments // users) > courses:
+        raise ValueError(f"{enrollments} enrollments need more than {courses} courses for {users} users")
+
+    rng = random.Random(seed)
+    now = timezone.now()
+    start = now - timedelta(days=365 * years)
+    course_keys = _create_courses(courses, orgs, rng, start, using)
+    course_weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(courses)))
+    countries = list(COUNTRY_WEIGHTS)
+    country_weights = list(itertools.accumulate(COUNTRY_WEIGHTS.values()))
+
+    with _explicit_timestamps(CourseEnrollment, 'created'):
+        for first in range(0, users, batch_size):
+            batch = range(first, min(first + batch_size, users))
+            User.objects.using(using).bulk_create([
+                User(
+                    username=f'{USERNAME_PREFIX}{index:09d}',
+                    email=f'{USERNAME_PREFIX}{index:09d}@example.com',
+                    password=UNUSABLE_PASSWORD_PREFIX,
+                    date_joined=start + (now - start) * ((index + rng.random()) / users),
+                )
+                for index in batch
+            ])
+            # SQLite returns no ids from bulk_create; usernames sort like the indexes
+            joined = User.objects.using(using).filter(
+                username__gte=f'{USERNAME_PREFIX}{batch[0]:09d}',
+                username__lte=f'{USERNAME_PREFIX}{batch[-1]:09d}',
+            ).order_by('username').values_list('id', 'date_joined')
+
+            profiles, batch_enrollments = [], []
+            for index, (user_id, date_joined) in zip(batch, joined):
+                profiles.append(UserProfile(
+                    user_id=user_id,
+                    name=f'Synthetic User {index}',
+                    country=rng.choices(countries, cum_weights=country_weights)[0] or None,
+                ))
+                count = enrollments // users + (index < enrollments % users)
+                for course_key in _pick_courses(course_keys, course_weights, count, rng):
+                    batch_enrollments.append(CourseEnrollment(
+                        user_id=user_id,
+                        course_id=course_key,
+                        created=date_joined + (now - date_joined) * rng.random(),
+                        is_active=rng.random() >= INACTIVE_RATE,
+                    ))
+            UserProfile.objects.using(using).bulk_create(profiles, batch_size=batch_size)
+            CourseEnrollment.objects.using(using).bulk_create(batch_enrollments, batch_size=batch_size)
+
+    return {'users': users, 'courses': courses, 'enrollments': enrollments}
+
+
+def clear(using=DEFAULT_DB_ALIAS):
+    """Delete everything :func:`generate` created."""
+    users = User.objects.using(using).filter(username__startswith=USERNAME_PREFIX)
+    courses = CourseOverview.objects.using(using).filter(org__startswith=ORG_PREFIX)
+    CourseEnrollment.objects.using(using).filter(Q(user__in=users) | Q(course__in=courses)).delete()
+    UserProfile.objects.using(using).filter(user__in=users).delete()
+    users.delete()
+    courses.delete()
@@ -0,0 +1,32 @@
+"""
+Celery tasks for edx_stats.
+"""
+from celery import shared_task
+
+from . import cache, precompute
+
+
+@shared_task(name='edx_stats.precompute_stats')
+def precompute_stats():
+    """Recompute every cached stat; schedule it every STATS_REFRESH_INTERVAL seconds."""
+    precompute.precompute_stats()
+
+
+@shared_task(name='edx_stats.reconcile_topn')
+def reconcile_topn():
+    """Correct any drift of the top-N counters from the source tables' counts."""
+    from .core import topn  # pylint: disable=import-outside-toplevel
+    topn.reconcile()
+
+
+@shared_task(name='edx_stats.flush_invalidations')
+def flush_invalidations(key_suffixes):
+    """Invalidate the stats whose changes were coalesced over STATS_INVALIDATION_WINDOW."""
+    cache.flush_pending(key_suffixes)
+
+
+@shared_task(name='edx_stats.flush_summary_deltas')
+def flush_summary_deltas():
+    """Add the registrations and enrollments of the last STATS_SUMMARY_FLUSH_INTERVAL to the summary tables."""
+    from .core import materialize  # pylint: disable=import-outside-toplevel
+    materialize.flush_deltas()
@@ -0,0 +1,17 @@
+"""
+Settings for the edx_stats tests.
+
+Run them from an Open edX checkout with this package and pytest-django
+installed::
+
+    pytest --ds=edx_stats.tests.settings --pyargs edx_stats.tests
+"""
+from lms.envs.test import *  # pylint: disable=wildcard-import,unused-wildcard-import
+
+# Shared by every thread of the process, like Redis is by every worker
+CACHES['default'] = {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}
+
+# The stats are read from a second SQLite alias, which mirrors the default
+# one the way a read replica does
+DATABASES['read_replica'] = dict(DATABASES['default'], TEST={'MIRROR': 'default'})
+STATS_DATABASE = 'read_replica'
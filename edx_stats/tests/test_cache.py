@@ -0,0 +1,59 @@
+"""
+Tests for the single-flight recompute and the versioning of the stats cache.
+"""
+import threading
+import time
+
+import pytest
+from django.core.cache import cache as django_cache
+
+from edx_stats import cache
+
+THREADS = 8
+
+
+# Each thread opens its own connection to bound the recompute's queries
+@pytest.mark.django_db(transaction=True)
+def test_concurrent_misses_compute_once():
+    """Concurrent requests for a key with no value wait for a single recompute."""
+    django_cache.clear()
+    cache.local_cache.clear()
+    computes = []
+    results = []
+    start = threading.Barrier(THREADS)
+
+    def compute():
+        computes.append(threading.get_ident())
+        time.sleep(1)
+        return {'total': 42}
+
+    def read():
+        start.wait()
+        results.append(cache.get_cached_stats(cache.get_cache_key('single_flight_test'), compute))
+
+    threads = [threading.Thread(target=read) for _ in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(computes) == 1
+    assert results == [{'total': 42}] * THREADS
+
+
+
+def test_writes_keep_the_local_cache():
+    """Writing a stat leaves the other stats in memory; invalidating drops them."""
+    django_cache.clear()
+    cache.local_cache.clear()
+    cache_key = cache.get_cache_key('version_test')
+    cache.set_cached_stats(cache_key, {'total': 1})
+    version = cache.get_stats_version()
+    assert cache.get_cached_stats(cache_key, dict) == {'total': 1}
+
+    cache.set_cached_stats(cache.get_cache_key('other_version_test'), {'total': 2})
+    assert cache.get_stats_version() == version
+    assert cache.local_cache.get(cache_key, version) is not None
+
+    cache.invalidate_stats(['version_test'])
+    assert cache.get_stats_version() != version
@@ -0,0 +1,42 @@
+"""
+Tests for the bounds on stat queries.
+"""
+import time
+
+import pytest
+from django.db import OperationalError, connections
+
+from edx_stats import app_settings, compute
+
+# Counts long enough to outlast any of the deadlines below
+SLOW_QUERY = (
+    'WITH RECURSIVE numbers(n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM numbers WHERE n < 10000000) '
+    'SELECT COUNT(*) FROM numbers'
+)
+
+
+@pytest.mark.django_db(databases=['default', 'read_replica'])
+def test_nested_sqlite_timeouts():
+    """Leaving a nested block keeps the outer block's deadline, and leaving the outer one clears it."""
+    connection = connections[app_settings.STATS_DATABASE]
+    if connection.vendor != 'sqlite':
+        pytest.skip("The progress handler deadline is SQLite's")
+
+    with compute.statement_timeout(0.2):
+        with compute.statement_timeout(60):
+            pass
+        time.sleep(0.3)
+        with pytest.raises(OperationalError):
+            with connection.cursor() as cursor:
+                cursor.execute(SLOW_QUERY)
+
+    with compute.statement_timeout(60):
+        with compute.statement_timeout(0.1):
+            time.sleep(0.2)
+            with pytest.raises(OperationalError):
+                with connection.cursor() as cursor:
+                    cursor.execute(SLOW_QUERY)
+
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT 1')
+        assert cursor.fetchone() == (1,)
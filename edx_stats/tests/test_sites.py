@@ -0,0 +1,58 @@
+"""
+Tests for the platform stats combined from the per-site shards.
+"""
+import pytest
+from django.contrib.auth import get_user_model
+from django.contrib.sites.models import Site
+from django.core.cache import cache as django_cache
+from django.db.models import Count
+from openedx.core.djangoapps.content.course_overviews.models import CourseOverview
+from openedx.core.djangoapps.site_configuration.models import SiteConfiguration
+from common.djangoapps.student.models import CourseEnrollment
+
+from edx_stats import app_settings, cache, sites, synthetic, views
+from edx_stats.core import backfill
+
+User = get_user_model()
+
+# Two of the three synthetic orgs get a site, so the platform has three shards
+SITE_ORGS = 2
+
+
+@pytest.fixture
+def sharded_platform(transactional_db):  # pylint: disable=unused-argument
+    """Synthetic data with a site for each of the first SITE_ORGS orgs."""
+    synthetic.generate(400, courses=12, orgs=SITE_ORGS + 1)
+    for index in range(SITE_ORGS):
+        domain = f'site{index}.example.com'
+        SiteConfiguration.objects.create(
+            site=Site.objects.create(domain=domain, name=domain),
+            enabled=True,
+            site_values={'SITE_NAME': domain, 'course_org_filter': f'{synthetic.ORG_PREFIX}{index}'},
+        )
+    django_cache.clear()
+    cache.local_cache.clear()
+
+
+# The shards are computed concurrently, each thread on its own connection
+@pytest.mark.django_db(transaction=True, databases=['default', 'read_replica'])
+@pytest.mark.parametrize('summary_tables', [False, True])
+def test_combined_platform_stats(sharded_platform, summary_tables):  # pylint: disable=redefined-outer-name,unused-argument
+    """The totals and top courses combined from the shards match a direct aggregate."""
+    assert app_settings.STATS_DATABASE == 'read_replica'
+    assert len(sites.get_shards()) == SITE_ORGS + 1
+    if summary_tables:
+        backfill.backfill()
+
+    total_stats = views.compute_stats('total_stats')
+    assert total_stats['total_courses'] == CourseOverview.objects.count()
+    assert total_stats['total_enrollments'] == CourseEnrollment.objects.count()
+    assert total_stats['total_users'] == User.objects.count()
+
+    top_courses = views.compute_stats('course_stats_top')
+    direct = CourseEnrollment.objects.values('course_id').annotate(
+        enrollment_count=Count('id')
+    ).order_by('-enrollment_count')[:app_settings.STATS_DASHBOARD_TOP_ITEMS]
+    assert [course['enrollment_count'] for course in top_courses] == [
+        course['enrollment_count'] for course in direct
+    ]
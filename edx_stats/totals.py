@@ -0,0 +1,143 @@
+"""
+Platform totals (courses, enrollments and users) for the dashboards.
+
+With STATS_APPROXIMATE_TOTALS enabled, totals are read from the database's
+table statistics (``pg_class.reltuples`` on PostgreSQL, ``TABLE_ROWS`` in
+``information_schema.TABLES`` on MySQL) instead of an exact ``COUNT(*)``,
+which is a full scan on both. Other databases, such as SQLite, always get
+exact counts.
+"""
+from django.contrib.auth import get_user_model
+from django.db import connections
+from django.db.models import Count
+from openedx.core.djangoapps.content.course_overviews.models import CourseOverview
+from common.djangoapps.student.models import CourseEnrollment
+
+from . import app_settings, sites
+
+User = get_user_model()
+
+# Table counted for each total
+TOTAL_TABLES = {
+    'total_courses': CourseOverview,
+    'total_enrollments': CourseEnrollment,
+    'total_users': User,
+}
+
+# Row estimates by table name, per database vendor; takes the table names as parameters
+ESTIMATE_QUERIES = {
+    'postgresql': (
+        "SELECT relname, reltuples FROM pg_class "
+        "WHERE relkind = 'r' AND pg_table_is_visible(oid) AND relname IN ({tables})"
+    ),
+    'mysql': (
+        "SELECT TABLE_NAME, TABLE_ROWS FROM information_schema.TABLES "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME IN ({tables})"
+    ),
+}
+
+
+def count_totals(names=None):
+    """
+    Count the rows of each total's table in a single round trip.
+
+    Args:
+        names (iterable): The totals to count, default all of TOTAL_TABLES
+
+    Returns:
+        dict: Count by total name
+    """
+    names = list(TOTAL_TABLES if names is None else names)
+    if not names:
+        return {}
+    connection = connections[app_settings.STATS_DATABASE]
+    sql = 'SELECT ' + ', '.join(
+        f'(SELECT COUNT(*) FROM {connection.ops.quote_name(TOTAL_TABLES[name]._meta.db_table)})'
+        for name in names
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql)
+        return dict(zip(names, cursor.fetchone()))
+
+
+def estimate_totals(names):
+    """
+    Estimate the rows of each total's table from the table statistics.
+
+    Args:
+        names (iterable): The totals to estimate
+
+    Returns:
+        dict: Estimate by total name, leaving out the totals the database has
+            no statistics for (never analyzed, or an unsupported vendor)
+    """
+    connection = connections[app_settings.STATS_DATABASE]
+    query = ESTIMATE_QUERIES.get(connection.vendor)
+    names_by_table = {TOTAL_TABLES[name]._meta.db_table: name for name in names}
+    if not query or not names_by_table:
+        return {}
+    with connection.cursor() as cursor:
+        cursor.execute(
+            query.format(tables=', '.join(['%s'] * len(names_by_table))),
+            list(names_by_table),
+        )
+        return {
+            names_by_table[table]: int(rows)
+            for table, rows in cursor.fetchall()
+            # PostgreSQL reports -1 for tables that were never analyzed
+            if rows is not None and rows >= 0
+        }
+
+
+def get_totals(summary=None, names=None):
+    """
+    Get every platform total.
+
+    Args:
+        summary: The ``core.materialize`` engine, when its tables are seeded;
+            its maintained user count is used instead of counting ``auth_user``
+        names (iterable): The totals to get, default all of TOTAL_TABLES
+
+    Returns:
+        dict: ``total_courses``, ``total_enrollments`` and ``total_users``,
+            plus ``approximate``, the names of the totals that are estimates
+    """
+    names = list(TOTAL_TABLES if names is None else names)
+    totals = {}
+    if summary is not None and 'total_users' in names:
+        totals['total_users'] = summary.total_users()
+        names.remove('total_users')
+
+    approximate = {}
+    if app_settings.STATS_APPROXIMATE_TOTALS:
+        approximate = estimate_totals(names)
+        totals.update(approximate)
+        names = [name for name in names if name not in approximate]
+
+    totals.update(count_totals(names))
+    totals['approximate'] = sorted(approximate)
+    return totals
+
+
+def count_scope_totals(scope):
+    """
+    Count the totals of one site's courses.
+
+    Table statistics cover whole tables, so these are always exact counts.
+
+    Args:
+        scope (sites.Scope): The site's courses
+
+    Returns:
+        dict: Same as :func:`get_totals`, with ``total_users`` the number of
+            users enrolled in the site's courses
+    """
+    courses = CourseOverview.objects.using(app_settings.STATS_DATABASE).filter(sites.course_filter(scope))
+    enrollments = CourseEnrollment.objects.using(app_settings.STATS_DATABASE).filter(
+        sites.course_filter(scope, 'course__')
+    ).aggregate(total_enrollments=Count('id'), total_users=Count('user', distinct=True))
+    return {
+        'total_courses': courses.count(),
+        **enrollments,
+        'approximate': [],
+    }
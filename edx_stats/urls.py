@@ -9,4 +9,11 @@ urlpatterns = [
     path('courses/', views.CourseListView.as_view(), name='course_list'),
     path('countries/', views.CountryListView.as_view(), name='country_list'),
     path('yearly/', views.YearlyStatsView.as_view(), name='yearly_stats'),
+
+    # Exports
+    path('export/<slug:name>.<slug:fmt>', views.ExportView.as_view(), name='export'),
+
+    # Metrics
+    path('metrics.json', views.MetricsView.as_view(), name='metrics'),
+    path('metrics', views.PrometheusMetricsView.as_view(), name='metrics_prometheus'),
 ]
\ No newline at end of file
@@ -1,19 +1,29 @@
 """
 Views for the edx_stats application.
 """
+import hashlib
 import logging
-from django.views.generic import TemplateView
+from functools import partial
+
+from django.apps import apps
+from django.core.exceptions import PermissionDenied
+from django.http import Http404, HttpResponse, JsonResponse
+from django.template.loader import render_to_string
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+from django.utils.safestring import mark_safe
+from django.utils.translation import get_language
+from django.views.generic import TemplateView, View
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib.auth.models import User
 from django.contrib.auth import authenticate, get_user_model
-from django.db.models import Count
-from django.db.models.functions import ExtractYear
+from django.db.models import Count, F, Q
 from openedx.core.djangoapps.content.course_overviews.models import CourseOverview
 from common.djangoapps.student.models import CourseEnrollment, UserProfile
 from openedx.core.djangoapps.site_configuration import helpers as configuration_helpers
 from django.conf import settings
 
-from . import cache
+from . import app_settings, cache, exports, metrics, pagination, replica, rollup, sites, totals
 
 logger = logging.getLogger(__name__)
 
@@ -26,16 +36,69 @@ class StaffRequiredMixin:
         return super().dispatch(request, *args, **kwargs)
 
 
-def get_course_stats():
+def get_summary_tables():
+    """
+    Return the ``core.materialize`` engine when its summary tables are
+    installed and seeded, otherwise None.
+    """
+    if not apps.is_installed('edx_stats.core'):
+        return None
+    from .core import materialize
+    return materialize if materialize.is_materialized(app_settings.STATS_DATABASE) else None
+
+
+def get_top_counters():
+    """
+    Return the ``core.topn`` engine when its counters are kept in Redis,
+    otherwise None.
+    """
+    if not apps.is_installed('edx_stats.core'):
+        return None
+    from .core import topn
+    return topn if topn.is_available() else None
+
+
+def get_course_stats(scope=sites.PLATFORM):
     """Get course statistics."""
-    return CourseOverview.objects.annotate(
+    summary = get_summary_tables()
+    if summary:
+        courses = summary.course_stats()
+        if scope != sites.PLATFORM:
+            courses = courses.filter(course_id__in=CourseOverview.objects.using(
+                app_settings.STATS_DATABASE
+            ).filter(sites.course_filter(scope)).values('id'))
+        return courses
+    return CourseOverview.objects.using(app_settings.STATS_DATABASE).filter(
+        sites.course_filter(scope)
+    ).annotate(
         enrollment_count=Count('courseenrollment')
-    ).order_by('-enrollment_count')
+    ).order_by('-enrollment_count').values(
+        'display_name', 'enrollment_count', course_id=F('id')
+    )
 
 
-def get_country_stats():
+def get_course_rows(scope=sites.PLATFORM):
+    """
+    Get every course as a compact ``(course_id, display_name,
+    enrollment_count)`` row, for caching the full course list.
+    """
+    return [
+        (str(course['course_id']), course['display_name'] or '', course['enrollment_count'])
+        for course in get_course_stats(scope)
+    ]
+
+
+def get_country_stats(scope=sites.PLATFORM):
     """Get country statistics."""
-    return UserProfile.objects.exclude(
+    summary = get_summary_tables()
+    if summary and scope == sites.PLATFORM:
+        return summary.country_stats()
+    profiles = UserProfile.objects.using(app_settings.STATS_DATABASE)
+    if scope != sites.PLATFORM:
+        profiles = profiles.filter(user__in=CourseEnrollment.objects.using(app_settings.STATS_DATABASE).filter(
+            sites.course_filter(scope, 'course__')
+        ).values('user_id'))
+    return profiles.exclude(
         country__isnull=True
     ).exclude(
         country=''
@@ -46,135 +109,510 @@ def get_country_stats():
     ).order_by('-user_count')
 
 
-def get_yearly_stats():
+def get_yearly_stats(scope=sites.PLATFORM):
     """Get yearly statistics."""
-    # Get user counts by year
-    user_counts = User.objects.annotate(
-        year=ExtractYear('date_joined')
-    ).values('year').annotate(
-        new_users=Count('id')
-    ).order_by('year')
-
-    # Get enrollment counts by year
-    enrollment_counts = CourseEnrollment.objects.annotate(
-        year=ExtractYear('created')
-    ).values('year').annotate(
-        new_enrollments=Count('id')
-    ).order_by('year')
-
-    # Combine user and enrollment stats
-    years = set()
-    year_data = {}
-
-    for count in user_counts:
-        year = count['year']
-        years.add(year)
-        if year not in year_data:
-            year_data[year] = {'new_users': 0, 'new_enrollments': 0}
-        year_data[year]['new_users'] = count['new_users']
-
-    for count in enrollment_counts:
-        year = count['year']
-        years.add(year)
-        if year not in year_data:
-            year_data[year] = {'new_users': 0, 'new_enrollments': 0}
-        year_data[year]['new_enrollments'] = count['new_enrollments']
+    summary = get_summary_tables()
+    if summary and scope == sites.PLATFORM:
+        return summary.yearly_stats()
 
-    return [
-        {'year': year, **year_data[year]}
-        for year in sorted(years)
-    ]
+    return rollup.get_rollup('year', scope)
 
 
-def get_total_stats():
+def get_total_stats(scope=sites.PLATFORM):
     """Get total statistics."""
-    logger.info("Getting total stats")
-    logger.debug(f"CourseOverview.objects.count(): {CourseOverview.objects.count()}")
-    logger.debug(f"CourseEnrollment.objects.count(): {CourseEnrollment.objects.count()}")
-    logger.debug(f"User.objects.count(): {User.objects.count()}")
+    if scope != sites.PLATFORM:
+        return totals.count_scope_totals(scope)
+    return totals.get_totals(get_summary_tables())
+
+
+def get_top_course_stats(scope=sites.PLATFORM):
+    """Get the top courses by enrollment for the dashboard."""
+    counters = get_top_counters()
+    if counters:
+        courses = counters.top_courses(scope, app_settings.STATS_DASHBOARD_TOP_ITEMS)
+        if courses is not None:
+            return courses
+    return list(get_course_stats(scope)[:app_settings.STATS_DASHBOARD_TOP_ITEMS])
+
+
+def get_top_country_stats(scope=sites.PLATFORM):
+    """Get the top countries by user count for the dashboard."""
+    counters = get_top_counters()
+    if counters and scope == sites.PLATFORM:
+        countries = counters.top_countries(app_settings.STATS_DASHBOARD_TOP_ITEMS)
+        if countries is not None:
+            return countries
+    return list(get_country_stats(scope)[:app_settings.STATS_DASHBOARD_TOP_ITEMS])
+
+
+# Function computing each cached stat for a scope, by cache key suffix
+STATS_FUNCTIONS = {
+    'course_stats_top': get_top_course_stats,
+    'country_stats_top': get_top_country_stats,
+    'yearly_stats': get_yearly_stats,
+    'total_stats': get_total_stats,
+    'course_stats_all': get_course_rows,
+    'country_stats_all': lambda scope=sites.PLATFORM: list(get_country_stats(scope)),
+}
+
+
+def combine_top_courses(shard_courses):
+    """Get the overall top courses from the top courses of every shard."""
+    courses = [course for courses in shard_courses for course in courses]
+    courses.sort(key=lambda course: -course['enrollment_count'])
+    return courses[:app_settings.STATS_DASHBOARD_TOP_ITEMS]
+
+
+def combine_total_stats(shard_totals):
+    """
+    Sum the course and enrollment totals of every shard. Users can be enrolled
+    on several sites, so their total is counted for the whole platform.
+    """
+    combined = totals.get_totals(get_summary_tables(), names=['total_users'])
+    for name in ('total_courses', 'total_enrollments'):
+        combined[name] = sum(shard[name] for shard in shard_totals)
+    combined['approximate'] = sorted(set(combined['approximate']).union(
+        *(shard['approximate'] for shard in shard_totals)
+    ))
+    return combined
+
+
+# Function combining the values of every shard into the platform-wide value,
+# for the stats that add up across shards
+STATS_COMBINERS = {
+    'course_stats_top': combine_top_courses,
+    'course_stats_all': lambda shard_rows: sorted(
+        (row for rows in shard_rows for row in rows), key=lambda row: -row[2]
+    ),
+    'total_stats': combine_total_stats,
+}
+
+
+def compute_stats(key_suffix, scope=sites.PLATFORM):
+    """
+    Compute a stat for ``scope``.
+
+    On multi-site installs, the platform-wide value of the stats in
+    STATS_COMBINERS is combined from the cached value of every shard, so the
+    platform is not scanned once more.
+    """
+    if scope == sites.PLATFORM and key_suffix in STATS_COMBINERS:
+        shards = sites.get_shards()
+        if shards != [sites.PLATFORM]:
+            shard_values = cache.get_cached_stats_many({
+                cache.get_cache_key(key_suffix, shard): partial(compute_stats, key_suffix, shard)
+                for shard in shards
+            })
+            if len(shard_values) < len(shards):
+                raise cache.StatsUnavailable(key_suffix)
+            with metrics.measure(key_suffix):
+                return STATS_COMBINERS[key_suffix](list(shard_values.values()))
+    with metrics.measure(key_suffix):
+        return STATS_FUNCTIONS[key_suffix](scope)
+
+
+def get_stats(key_suffix, scope=None):
+    """
+    Get a stat from the cache, computing it if not cached.
+
+    ``scope`` defaults to the current site's.
+    """
+    if scope is None:
+        scope = sites.get_current_scope()
+    return cache.get_cached_stats(cache.get_cache_key(key_suffix, scope), partial(compute_stats, key_suffix, scope))
+
+
+def get_stats_many(key_suffixes, scope=None):
+    """
+    Get several stats in one cache round trip, computing any missing ones
+    concurrently.
+
+    Returns:
+        dict: The data of each stat, by cache key suffix, leaving out the
+            stats that could not be computed in time
+    """
+    if scope is None:
+        scope = sites.get_current_scope()
+    cache_keys = {cache.get_cache_key(key_suffix, scope): key_suffix for key_suffix in key_suffixes}
+    data = cache.get_cached_stats_many({
+        cache_key: partial(compute_stats, key_suffix, scope) for cache_key, key_suffix in cache_keys.items()
+    })
     return {
-        'total_courses': CourseOverview.objects.count(),
-        'total_enrollments': CourseEnrollment.objects.count(),
-        'total_users': User.objects.count(),
+        key_suffix: data[cache_key]
+        for cache_key, key_suffix in cache_keys.items() if cache_key in data
     }
 
 
-class DashboardView(LoginRequiredMixin, StaffRequiredMixin, TemplateView):
+def get_stats_validators(key_suffixes, *extra):
+    """
+    Get the validators of a response showing the stats ``key_suffixes``, and
+    the ``extra`` values, as they are served to the current request.
+
+    The stats are read first, like :func:`get_stats_many`, so the view
+    reading them next gets the same values from this worker's memory.
+
+    Returns:
+        tuple: A weak ETag, which changes with the data of any of the stats,
+            the ``extra`` values or the language, and the time the newest
+            stat was computed; or ``(None, None)`` when a stat is unavailable
+    """
+    get_stats_many(key_suffixes)
+    version = cache.get_content_version([cache.get_cache_key(key_suffix) for key_suffix in key_suffixes])
+    if version is None:
+        return None, None
+    return get_version_validators(version.etag, *extra, last_modified=int(version.computed))
+
+
+def get_version_validators(version, *extra, last_modified=None):
+    """
+    Get the validators of a response showing data at ``version``, and the
+    ``extra`` values.
+
+    Returns:
+        tuple: A weak ETag, which changes with ``version``, the ``extra``
+            values or the language, and ``last_modified``; or
+            ``(None, None)`` when ``version`` is None
+    """
+    if version is None:
+        return None, None
+    etag = hashlib.md5(repr((version, get_language(), extra)).encode()).hexdigest()[:16]
+    return f'W/"{etag}"', last_modified
+
+
+def not_modified_response(request, validators):
+    """
+    Get a 304 Not Modified response when the client's ``If-None-Match`` or
+    ``If-Modified-Since`` match ``validators``, otherwise None.
+    """
+    etag, last_modified = validators
+    if etag is None:
+        return None
+    return get_conditional_response(request, etag=etag, last_modified=last_modified)
+
+
+def set_validators(response, validators):
+    """
+    Add the ETag and Last-Modified (when known) of ``validators`` to
+    ``response``, and have browsers revalidate it on every use. The response
+    depends on the session's user and site, so it also varies on the cookie.
+    """
+    etag, last_modified = validators
+    if etag is not None and response.status_code in (200, 304):
+        response['ETag'] = etag
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified)
+        patch_cache_control(response, private=True, no_cache=True)
+        patch_vary_headers(response, ('Cookie',))
+    return response
+
+
+class ConditionalStatsMixin:
+    """
+    Answer a GET with 304 Not Modified, without rendering, when the client
+    already has the response for the current data of ``stats_keys``.
+
+    List it after the access mixins. The stats are read before rendering; if
+    that fails, the view renders as usual, without validators. Views showing
+    other data override :meth:`get_validators`.
+    """
+    stats_keys = ()
+
+    def get_validator_extras(self):
+        """Get the values shown besides the stats, that the ETag also covers."""
+        return ()
+
+    def get_validators(self):
+        """Get the ETag and Last-Modified of the response, see :func:`get_stats_validators`."""
+        return get_stats_validators(self.stats_keys, *self.get_validator_extras())
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return super().dispatch(request, *args, **kwargs)
+        try:
+            validators = self.get_validators()
+        except Exception:  # pylint: disable=broad-except
+            validators = (None, None)
+        response = not_modified_response(request, validators) or super().dispatch(request, *args, **kwargs)
+        return set_validators(response, validators)
+
+
+def render_fragment(template_name, get_context, content_version, params=()):
+    """
+    Render a list partial, or get it from the fragment cache while the data
+    it shows is unchanged.
+
+    Args:
+        template_name (str): The partial's template
+        get_context (callable): Function getting its context, only called
+            when it is rendered
+        content_version: The version of the data it shows, or None to render
+            it uncached
+        params (tuple): The other values its HTML depends on, e.g. its page
+
+    Returns:
+        str: The HTML, safe to output unescaped
+    """
+    def render():
+        return render_to_string(template_name, get_context())
+
+    if not app_settings.STATS_FRAGMENT_CACHE or content_version is None:
+        return mark_safe(render())
+    return mark_safe(cache.get_cached_fragment(template_name, content_version, params, render))
+
+
+# Fields of the compact course rows
+COURSE_ROW_FIELDS = ('course_id', 'display_name', 'enrollment_count')
+
+# Orderings of the course list; the last field of each is unique
+COURSE_SORTS = {
+    'enrollments': ('-enrollment_count', 'course_id'),
+    'name': ('display_name', 'course_id'),
+    'course_id': ('course_id',),
+}
+
+
+def get_course_list_version(scope=None):
+    """
+    Get a version of the course list's data, which changes whenever the
+    stats of one of the courses do.
+
+    This is the content version of the cached compact rows of every course,
+    normally read from this worker's memory. With the summary tables seeded
+    the pages themselves are read live from ``CourseStats``, but are still
+    keyed by this version rather than by an aggregate over the table on every
+    request, so a change to a course reaches the cached pages along with the
+    cached rows, once its invalidation is flushed.
+    """
+    if scope is None:
+        scope = sites.get_current_scope()
+    get_stats('course_stats_all', scope)
+    version = cache.get_content_version([cache.get_cache_key('course_stats_all', scope)])
+    return version and version.etag
+
+
+def get_course_page(sort='enrollments', query='', cursor=None):
+    """
+    Get one page of the course list.
+
+    With the summary tables seeded, the page is read straight from
+    ``CourseStats`` with a keyset range query. Otherwise it is cut from the
+    cached compact rows of every course.
+
+    Args:
+        sort (str): A key of COURSE_SORTS
+        query (str): Only include courses whose name or id contains this
+        cursor (str): The next-page cursor of the previous page, if any
+
+    Returns:
+        tuple: The page as a list of dicts, and the cursor of the next page
+            (None on the last page)
+    """
+    order_by = COURSE_SORTS[sort]
+    page_size = app_settings.STATS_COURSE_LIST_PAGE_SIZE
+    summary = get_summary_tables()
+    if summary:
+        courses = get_course_stats(sites.get_current_scope()).order_by(*order_by)
+        if query:
+            courses = courses.filter(Q(display_name__icontains=query) | Q(course_id__icontains=query))
+        after = pagination.decode_cursor(cursor, order_by)
+        if after is not None:
+            courses = courses.filter(pagination.keyset_filter(order_by, after))
+        rows = list(courses.values_list(*COURSE_ROW_FIELDS)[:page_size + 1])
+        page = rows[:page_size]
+        next_cursor = None
+        if len(rows) > page_size:
+            last = dict(zip(COURSE_ROW_FIELDS, page[-1]))
+            next_cursor = pagination.encode_cursor([last[field.lstrip('-')] for field in order_by])
+    else:
+        rows = get_stats('course_stats_all')
+        if query:
+            query = query.lower()
+            rows = [row for row in rows if query in row[0].lower() or query in row[1].lower()]
+        page, next_cursor = pagination.paginate_rows(
+            rows, order_by, COURSE_ROW_FIELDS, cursor, page_size
+        )
+    return [dict(zip(COURSE_ROW_FIELDS, row)) for row in page], next_cursor
+
+
+def iter_course_rows(scope=sites.PLATFORM):
+    """
+    Stream every course as a ``(course_id, display_name, enrollment_count)``
+    row, ordered by course id and read STATS_EXPORT_CHUNK_SIZE rows at a time.
+    """
+    for course_id, display_name, enrollment_count in pagination.iter_keyset(
+        get_course_stats(scope), ('course_id',), COURSE_ROW_FIELDS, app_settings.STATS_EXPORT_CHUNK_SIZE
+    ):
+        yield str(course_id), display_name or '', enrollment_count
+
+
+def iter_country_rows(scope=sites.PLATFORM):
+    """Stream every country as a ``(country, user_count)`` row, ordered by country."""
+    for country, user_count in pagination.iter_keyset(
+        get_country_stats(scope), ('country',), ('country', 'user_count'), app_settings.STATS_EXPORT_CHUNK_SIZE
+    ):
+        yield str(country), user_count
+
+
+def iter_yearly_rows(scope=sites.PLATFORM):
+    """Get every year as a ``(year, new_users, new_enrollments)`` row."""
+    for stat in get_yearly_stats(scope):
+        yield stat['year'], stat['new_users'], stat['new_enrollments']
+
+
+# Columns and row generator of each export, by name
+EXPORTS = {
+    'courses': (COURSE_ROW_FIELDS, iter_course_rows),
+    'countries': (('country', 'user_count'), iter_country_rows),
+    'yearly': (('year', 'new_users', 'new_enrollments'), iter_yearly_rows),
+}
+
+
+class DashboardView(LoginRequiredMixin, StaffRequiredMixin, ConditionalStatsMixin, TemplateView):
     """Main dashboard view"""
     template_name = 'edx_stats/dashboard.html'
+    stats_keys = ['course_stats_top', 'country_stats_top', 'yearly_stats', 'total_stats']
+    freshness = None
     logger.info("Getting dashboard context")
+
+    def get_validator_extras(self):
+        # The lag changes on every measurement; only a new minute of it, or
+        # crossing the warning threshold, changes the page enough to resend it
+        self.freshness = replica.get_freshness()
+        lag = self.freshness['replica_lag']
+        return (self.freshness['replica_lagging'], None if lag is None else int(lag // 60))
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
 
         # Get cached stats
-        course_stats = cache.get_cached_stats(
-            cache.get_cache_key('course_stats_top'),
-            lambda: list(get_course_stats()[:10])
-        )
-
-        country_stats = cache.get_cached_stats(
-            cache.get_cache_key('country_stats_top'),
-            lambda: list(get_country_stats()[:10])
-        )
-
-        yearly_stats = cache.get_cached_stats(
-            cache.get_cache_key('yearly_stats'),
-            get_yearly_stats
-        )
-
-        total_stats = cache.get_cached_stats(
-            cache.get_cache_key('total_stats'),
-            get_total_stats
-        )
+        stats = get_stats_many(self.stats_keys)
 
         context.update({
-            'course_stats': course_stats,
-            'country_stats': country_stats,
-            'yearly_stats': yearly_stats,
-            **total_stats,
+            'course_stats': stats.get('course_stats_top', []),
+            'country_stats': stats.get('country_stats_top', []),
+            'yearly_stats': stats.get('yearly_stats', []),
+            **stats.get('total_stats', {}),
+            'unavailable': [key_suffix for key_suffix in self.stats_keys if key_suffix not in stats],
+            **(self.freshness or replica.get_freshness()),
             'platform_name': configuration_helpers.get_value('PLATFORM_NAME', settings.PLATFORM_NAME),
         })
 
         return context
 
 
-class CourseListView(LoginRequiredMixin, StaffRequiredMixin, TemplateView):
-    """View for listing all courses"""
+class CourseListView(LoginRequiredMixin, StaffRequiredMixin, ConditionalStatsMixin, TemplateView):
+    """View for listing all courses, one keyset page at a time"""
     template_name = 'edx_stats/course_list.html'
+    list_version = None
+
+    def is_next_page(self):
+        # HTMX infinite scroll only needs the next rows
+        return bool(self.request.headers.get('HX-Request') and self.request.GET.get('after'))
+
+    def get_list_params(self):
+        """Get the sort, search query and cursor of the requested page."""
+        sort = self.request.GET.get('sort')
+        if sort not in COURSE_SORTS:
+            sort = 'enrollments'
+        return sort, self.request.GET.get('q', '').strip(), self.request.GET.get('after')
+
+    def get_validators(self):
+        # Same version as the list fragment, so a 304 is sent exactly while
+        # the cached fragment of the page is still current
+        self.list_version = get_course_list_version()
+        return get_version_validators(
+            self.list_version, *self.get_list_params(), app_settings.STATS_COURSE_LIST_PAGE_SIZE, self.is_next_page()
+        )
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['courses'] = cache.get_cached_stats(
-            cache.get_cache_key('course_stats_all'),
-            lambda: list(get_course_stats())
-        )
+        sort, query, cursor = self.get_list_params()
+
+        def get_page_context():
+            courses, next_cursor = get_course_page(sort, query, cursor)
+            return {'courses': courses, 'next_cursor': next_cursor, 'sort': sort, 'q': query}
+
+        context.update({
+            'course_list': render_fragment(
+                'edx_stats/partials/course_rows.html' if self.is_next_page() else 'edx_stats/partials/course_list.html',
+                get_page_context,
+                self.list_version or get_course_list_version(),
+                (sort, query, cursor, app_settings.STATS_COURSE_LIST_PAGE_SIZE),
+            ),
+            'sort': sort,
+            'sorts': list(COURSE_SORTS),
+            'q': query,
+        })
         context['platform_name'] = configuration_helpers.get_value('PLATFORM_NAME', settings.PLATFORM_NAME)
         return context
 
+    def render_to_response(self, context, **response_kwargs):
+        if self.is_next_page():
+            return HttpResponse(context['course_list'])
+        return super().render_to_response(context, **response_kwargs)
 
-class CountryListView(LoginRequiredMixin, StaffRequiredMixin, TemplateView):
+
+class CountryListView(LoginRequiredMixin, StaffRequiredMixin, ConditionalStatsMixin, TemplateView):
     """View for listing all countries"""
     template_name = 'edx_stats/country_list.html'
+    stats_keys = ['country_stats_all']
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['countries'] = cache.get_cached_stats(
-            cache.get_cache_key('country_stats_all'),
-            lambda: list(get_country_stats())
+        countries = get_stats('country_stats_all')
+        version = cache.get_content_version([cache.get_cache_key('country_stats_all')])
+        context['country_list'] = render_fragment(
+            'edx_stats/partials/country_list.html',
+            lambda: {'countries': countries},
+            version and version.etag,
         )
         context['platform_name'] = configuration_helpers.get_value('PLATFORM_NAME', settings.PLATFORM_NAME)
         return context
 
 
-class YearlyStatsView(LoginRequiredMixin, StaffRequiredMixin, TemplateView):
+class YearlyStatsView(LoginRequiredMixin, StaffRequiredMixin, ConditionalStatsMixin, TemplateView):
     """View for yearly statistics"""
     template_name = 'edx_stats/yearly_stats.html'
+    stats_keys = ['yearly_stats']
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['yearly_stats'] = cache.get_cached_stats(
-            cache.get_cache_key('yearly_stats'),
-            get_yearly_stats
-        )
+        context['yearly_stats'] = get_stats('yearly_stats')
         context['platform_name'] = configuration_helpers.get_value('PLATFORM_NAME', settings.PLATFORM_NAME)
-        return context
\ No newline at end of file
+        return context
+
+
+class ExportView(LoginRequiredMixin, StaffRequiredMixin, View):
+    """Stream a full listing as CSV or NDJSON, straight from the database"""
+
+    def get(self, request, name, fmt, *args, **kwargs):
+        if name not in EXPORTS or fmt not in exports.FORMATS:
+            raise Http404
+        fields, rows = EXPORTS[name]
+        return exports.streaming_response(name, fmt, fields, rows(sites.get_current_scope()))
+
+
+class MetricsView(LoginRequiredMixin, StaffRequiredMixin, View):
+    """Per-stat cache and compute metrics of every worker, as JSON"""
+
+    def get(self, request, *args, **kwargs):
+        if not metrics.enabled():
+            raise Http404
+        return JsonResponse({'stats': metrics.get_metrics(STATS_FUNCTIONS)})
+
+
+class PrometheusMetricsView(View):
+    """
+    The same metrics in the Prometheus text format, for staff or a scraper
+    sending STATS_METRICS_TOKEN
+    """
+
+    def get(self, request, *args, **kwargs):
+        if not metrics.enabled():
+            raise Http404
+        if not (request.user.is_staff or metrics.has_token(request)):
+            raise PermissionDenied
+        return HttpResponse(
+            metrics.prometheus_text(STATS_FUNCTIONS),
+            content_type='text/plain; version=0.0.4; charset=utf-8',
+        )
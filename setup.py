@@ -21,6 +21,7 @@ setup(
         'dev': [
             'pytest>=7.0.0',
             'pytest-django>=4.5.0',
+            'pytest-benchmark>=4.0.0',
             'pytest-cov>=3.0.0',
             'black>=22.0.0',
             'isort>=5.10.0',